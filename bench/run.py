@@ -0,0 +1,265 @@
+"""
+Benchmarks Kreper against a local synthetic site and prints (or saves)
+machine-readable results that can be compared across commits.
+
+    python bench/run.py --out before.json
+    python bench/run.py --out after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from synthetic_site import add_site_arguments, site_from_args  # noqa: E402
+
+SCENARIOS = ('crawl', 'extract', 'download', 'output', 'gtags', 'crawl_website')
+
+
+def _load_script(name, path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _timed_transport(pool_size):
+    from kreper.transport import Transport
+
+    class TimedTransport(Transport):
+        # Records the wall time of every request for the latency percentiles
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def get(self, url, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().get(url, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    return TimedTransport(pool_size=pool_size, retries=0)
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def _latency(transport):
+    return {
+        'requests': len(transport.latencies),
+        'latency_p50_ms': round(_percentile(transport.latencies, 50) * 1000, 3) if transport.latencies else None,
+        'latency_p99_ms': round(_percentile(transport.latencies, 99) * 1000, 3) if transport.latencies else None,
+    }
+
+
+def _quiet_scraper(url, transport):
+    import skraper
+    skraper.console.quiet = True
+    return skraper.Kreper(url, transport=transport)
+
+
+def bench_crawl(base_url, site, options):
+    from kreper.extract import ExtractionPlan
+
+    transport = _timed_transport(options.workers)
+    scraper = _quiet_scraper(f"{base_url}/", transport)
+    plan = ExtractionPlan(tags=['h1', 'h2', 'span'], meta=True, table=True)
+    start = time.perf_counter()
+    scraper.crawl(site['pages'], site['pages'], options.workers, plan=plan, parse_workers=options.parse_workers)
+    elapsed = time.perf_counter() - start
+    return dict(_latency(transport), pages=len(scraper.visited), records=len(scraper.data), seconds=round(elapsed, 4),
+                pages_per_sec=round(len(scraper.visited) / elapsed, 2))
+
+
+def bench_extract(base_url, site, options):
+    from kreper.parser import parse
+
+    transport = _timed_transport(4)
+    urls = [f"{base_url}/page/{i}.html" for i in range(min(options.sample, site['pages']))]
+    bodies = {url: transport.get(url).content for url in urls}
+    megabytes = sum(len(body) for body in bodies.values()) / (1024 * 1024)
+
+    results = {'pages': len(urls), 'megabytes': round(megabytes, 3)}
+    for label, only in (('full', None), ('partial', ['h1', 'h2', 'span', 'table', 'meta'])):
+        start = time.perf_counter()
+        for body in bodies.values():
+            parse(body, only=only)
+        results[f"parse_{label}_ms_per_mb"] = round((time.perf_counter() - start) * 1000 / megabytes, 3)
+
+    extractors = {
+        'extract_tags': lambda scraper: scraper.extract_tags(['h1', 'h2', 'span']),
+        'extract_images': lambda scraper: scraper.extract_images(),
+        'extract_video': lambda scraper: scraper.extract_video(),
+        'extract_audio': lambda scraper: scraper.extract_audio(),
+        'extract_meta': lambda scraper: scraper.extract_meta(),
+        'extract_table': lambda scraper: scraper.extract_table(),
+    }
+    for name, extractor in extractors.items():
+        elapsed = 0.0
+        for url, body in bodies.items():
+            scraper = _quiet_scraper(url, transport)
+            # Served from the document cache, so only parse + extract is timed
+            scraper.pages[url] = body
+            start = time.perf_counter()
+            extractor(scraper)
+            elapsed += time.perf_counter() - start
+        results[f"{name}_ms_per_page"] = round(elapsed * 1000 / len(urls), 3)
+    return results
+
+
+def bench_download(base_url, site, options):
+    transport = _timed_transport(options.workers)
+    total = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as media_dir:
+        for i in range(min(options.sample, site['pages'])):
+            scraper = _quiet_scraper(f"{base_url}/page/{i}.html", transport)
+            scraper.download_images(media_dir, options.workers)
+            scraper.download_videos(media_dir, options.workers)
+        for name in os.listdir(media_dir):
+            total += os.path.getsize(os.path.join(media_dir, name))
+    elapsed = time.perf_counter() - start
+    return dict(_latency(transport), megabytes=round(total / (1024 * 1024), 3), seconds=round(elapsed, 4),
+                mb_per_sec=round(total / (1024 * 1024) / elapsed, 2))
+
+
+def bench_output(base_url, site, options):
+    from kreper.writers import FORMATS
+
+    scraper = _quiet_scraper(base_url, None)
+    scraper.data = [{'h2': f"Section {i} " + 'text ' * 20} for i in range(options.records)]
+    results = {'records': options.records}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for format in FORMATS:
+            start = time.perf_counter()
+            scraper.output_data(format, 'bench', 'bench', output_dir)
+            elapsed = time.perf_counter() - start
+            results[f"{format}_records_per_sec"] = round(options.records / elapsed, 2)
+    return results
+
+
+def bench_gtags(base_url, site, options):
+    gtags = _load_script('gtags', os.path.join('gettags', 'gtags.py'))
+    transport = _timed_transport(4)
+    count = min(options.sample, site['pages'])
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(count):
+            gtags.extract_tags(f"{base_url}/page/{i}.html", ['table', 'h1'], transport)
+    elapsed = time.perf_counter() - start
+    return dict(_latency(transport), pages=count, seconds=round(elapsed, 4), pages_per_sec=round(count / elapsed, 2))
+
+
+def bench_crawl_website(base_url, site, options):
+    crawl = _load_script('crawl_script', os.path.join('crawl', 'crawl.py'))
+    transport = _timed_transport(options.workers)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pages = crawl.crawl_website(f"{base_url}/", site['pages'], options.workers, site['pages'], transport)
+    elapsed = time.perf_counter() - start
+    return dict(_latency(transport), pages=pages, seconds=round(elapsed, 4), pages_per_sec=round(pages / elapsed, 2))
+
+
+def _run_scenario(name, base_url, site, options, queue):
+    try:
+        result = globals()[f"bench_{name}"](base_url, site, options)
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 2)
+        queue.put((name, result))
+    except Exception as e:
+        queue.put((name, {'error': repr(e)}))
+
+
+def run(scenarios, site, options):
+    base_url = site.start()
+    results = {}
+    # Every scenario runs in a fresh process so peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+    try:
+        for name in scenarios:
+            queue = context.Queue()
+            process = context.Process(target=_run_scenario, args=(name, base_url, site.params(), options, queue))
+            process.start()
+            _, results[name] = queue.get()
+            process.join()
+    finally:
+        site.stop()
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    lines = []
+    for scenario, metrics in current['results'].items():
+        old_metrics = baseline.get('results', {}).get(scenario, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                lines.append(f"{scenario:14} {metric:32} {old:>12} -> {value:>12} ({(value - old) / old * 100:+.1f}%)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kreper benchmarks')
+    add_site_arguments(parser)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='Scenarios to run')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent workers for crawls and downloads')
+    parser.add_argument('--parse-workers', type=int, default=0, help='Parse processes for the crawl scenario')
+    parser.add_argument('--sample', type=int, default=20, help='Pages used by the per-page scenarios')
+    parser.add_argument('--records', type=int, default=20000, help='Records written by the output scenario')
+    parser.add_argument('--out', type=str, help='Write results to this JSON file instead of stdout')
+    parser.add_argument('--compare', type=str, help='Baseline results JSON to compare against')
+    options = parser.parse_args()
+
+    site = site_from_args(options)
+    report = {
+        'commit': _commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'site': site.params(),
+        'options': {'workers': options.workers, 'parse_workers': options.parse_workers,
+                    'sample': options.sample, 'records': options.records},
+        'results': run(options.scenarios, site, options),
+    }
+
+    if options.out:
+        with open(options.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if options.compare:
+        with open(options.compare) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Local HTTP server serving a generated site graph for the benchmarks.
+
+    python bench/synthetic_site.py --pages 500 --fanout 10 --latency 0.02
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('kreper', 'scrape', 'crawl', 'extract', 'table', 'media', 'page', 'link', 'data', 'value', 'python', 'site')
+
+
+class SyntheticSite:
+    """
+    A deterministic site: `pages` HTML pages where page i links to `fanout`
+    other pages, carries roughly `page_size` bytes of text, headings, spans,
+    a table and meta tags, and embeds `images` images and `videos` videos.
+
+    Args:
+    pages (int): Number of pages.
+    fanout (int): Links per page.
+    page_size (int): Approximate HTML size of a page in bytes.
+    images (int): Images per page.
+    videos (int): Videos per page.
+    image_size (int): Bytes per image.
+    video_size (int): Bytes per video.
+    latency (float): Seconds slept before answering each request.
+    seed (int): Seed for the link graph and text.
+    """
+
+    def __init__(self, pages=200, fanout=8, page_size=20000, images=4, videos=1, image_size=20000,
+                 video_size=500000, latency=0.0, seed=0):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.images = images
+        self.videos = videos
+        self.image_size = image_size
+        self.video_size = video_size
+        self.latency = latency
+        self.seed = seed
+        self.last_modified = formatdate(usegmt=True)
+        self._cache = {}
+        self._server = None
+
+    def params(self):
+        return {name: getattr(self, name) for name in (
+            'pages', 'fanout', 'page_size', 'images', 'videos', 'image_size', 'video_size', 'latency', 'seed')}
+
+    def links(self, i):
+        rng = random.Random(self.seed * 1000003 + i)
+        # Always link to the next page so every page is reachable from page 0
+        targets = [(i + 1) % self.pages]
+        targets += [rng.randrange(self.pages) for _ in range(self.fanout - 1)]
+        return targets
+
+    def page(self, i):
+        if i in self._cache:
+            return self._cache[i]
+        rng = random.Random(self.seed * 7919 + i)
+        parts = [
+            '<!DOCTYPE html><html><head>',
+            f'<title>Page {i}</title>',
+            f'<meta name="description" content="Synthetic page {i}">',
+            '<meta name="keywords" content="kreper,benchmark">',
+            '</head><body>',
+            f'<h1>Page {i}</h1>',
+        ]
+        parts += [f'<a href="/page/{target}.html">page {target}</a>' for target in self.links(i)]
+        parts += [f'<img src="/media/img-{i}-{k}.png" alt="image {k}">' for k in range(self.images)]
+        parts += [f'<video src="/media/vid-{i}-{k}.mp4"></video>' for k in range(self.videos)]
+        parts.append('<table><thead><tr><th>name</th><th>value</th><th>score</th></tr></thead><tbody>')
+        parts += [f'<tr><td>row {r}</td><td>{rng.randrange(1000)}</td><td>{rng.random():.3f}</td></tr>' for r in range(20)]
+        parts.append('</tbody></table>')
+
+        size = sum(len(part) for part in parts)
+        section = 0
+        while size < self.page_size:
+            text = ' '.join(rng.choice(WORDS) for _ in range(40))
+            chunk = f'<h2>Section {section}</h2><p>{text} <span>{rng.choice(WORDS)}</span></p>'
+            parts.append(chunk)
+            size += len(chunk)
+            section += 1
+        parts.append('</body></html>')
+
+        body = ''.join(parts).encode('utf-8')
+        self._cache[i] = body
+        return body
+
+    def media(self, name, size):
+        # Deterministic bytes so repeated runs download identical files
+        block = hashlib.sha256(name.encode()).digest() * 64
+        return (block * (size // len(block) + 1))[:size]
+
+    def start(self, host='127.0.0.1', port=0):
+        site = self
+
+        class Handler(_Handler):
+            pass
+        Handler.site = site
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+    site = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        site = self.site
+        if site.latency:
+            time.sleep(site.latency)
+
+        path = self.path.split('?')[0]
+        content_type = 'text/html; charset=utf-8'
+        if path in ('/', '/index.html'):
+            body = site.page(0)
+        elif path == '/robots.txt':
+            body, content_type = b'User-agent: *\nAllow: /\n', 'text/plain'
+        elif re.fullmatch(r'/page/\d+\.html', path) and int(path[6:-5]) < site.pages:
+            body = site.page(int(path[6:-5]))
+        elif path.startswith('/media/img-'):
+            body, content_type = site.media(path, site.image_size), 'image/png'
+        elif path.startswith('/media/vid-'):
+            body, content_type = site.media(path, site.video_size), 'video/mp4'
+        else:
+            self.send_error(404)
+            return
+
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 200
+        start = 0
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and not content_type.startswith('text/'):
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', site.last_modified)
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=200, help='Number of pages on the site')
+    parser.add_argument('--fanout', type=int, default=8, help='Links per page')
+    parser.add_argument('--page-size', type=int, default=20000, help='Approximate page size in bytes')
+    parser.add_argument('--images', type=int, default=4, help='Images per page')
+    parser.add_argument('--videos', type=int, default=1, help='Videos per page')
+    parser.add_argument('--image-size', type=int, default=20000, help='Bytes per image')
+    parser.add_argument('--video-size', type=int, default=500000, help='Bytes per video')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency injected per request')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated site')
+
+
+def site_from_args(args):
+    return SyntheticSite(pages=args.pages, fanout=args.fanout, page_size=args.page_size, images=args.images,
+                         videos=args.videos, image_size=args.image_size, video_size=args.video_size,
+                         latency=args.latency, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic benchmark site')
+    add_site_arguments(parser)
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    args = parser.parse_args()
+
+    site = site_from_args(args)
+    print(f"Serving synthetic site on {site.start(port=args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,68 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-import argparse
-
-def crawl_website(url, depth, current_depth=0, visited=None):
-    if visited is None:
-        visited = set()
-    
-    if current_depth > depth:
-        return
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-    except requests.exceptions.RequestException as err:
-        print(f"Request Exception: {err}")
-        return
-    
-    visited.add(url)
-    print(f"Crawling: {url} (Depth: {current_depth})")
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    for link in soup.find_all('a', href=True):
-        href = link['href']
-        # Join relative URLs with base URL
-        if not bool(urlparse(href).netloc):
-            href = urljoin(url, href)
-        
-        # Skip links that are not HTTP or HTTPS
-        if urlparse(href).scheme not in ['http', 'https']:
-            continue
-        
-        # Skip already visited links
-        if href in visited:
-            continue
-        
-        crawl_website(href, depth, current_depth + 1, visited)
-
-
-def main():
-    parser = argparse.ArgumentParser(description='Website Crawler')
-    parser.add_argument('url', type=str, help='Website URL to crawl')
-    parser.add_argument('--depth', type=int, default=1, help='Crawling depth')
-    
-    args = parser.parse_args()
-    crawl_website(args.url, args.depth)
-
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import requests
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from kreper.crawler import Crawler
+from kreper.dedup import add_dedup_arguments, detector_from_args
+from kreper.frontier import add_frontier_arguments, frontier_from_args
+from kreper.metrics import add_stats_arguments, collect_stats
+from kreper.parser import extract_links
+from kreper.politeness import add_politeness_arguments, scheduler_from_args
+from kreper.transport import Transport, add_transport_arguments, transport_from_args
+
+def crawl_website(url, depth, workers=8, limit=10000, transport=None, frontier=None, scheduler=None, dedup=None):
+    transport = transport or Transport(pool_size=max(workers, 10))
+
+    def visit(page_url, current_depth):
+        try:
+            response = transport.get(page_url)
+            response.raise_for_status()  # Raise an exception for HTTP errors
+        except requests.exceptions.RequestException as err:
+            print(f"Request Exception: {err}")
+            return None
+
+        if dedup:
+            duplicate = dedup.check(page_url, response.content, response.encoding)
+            if duplicate:
+                return duplicate
+        # Only the links are needed, so no tree is built
+        return None, extract_links(response.content, page_url, response.encoding)
+
+    def on_page(page_url, current_depth, result):
+        print(f"Crawling: {page_url} (Depth: {current_depth})")
+
+    def on_duplicate(page_url, current_depth, duplicate):
+        print(f"Skipping duplicate: {page_url} (of {duplicate.original})")
+
+    crawler = Crawler(visit, depth=depth, limit=limit, workers=workers, on_page=on_page, frontier=frontier,
+                      scheduler=scheduler, on_duplicate=on_duplicate)
+    return crawler.run([url])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Website Crawler')
+    parser.add_argument('url', type=str, help='Website URL to crawl')
+    parser.add_argument('--depth', type=int, default=1, help='Crawling depth')
+    parser.add_argument('--limit', type=int, default=10000, help='Limit number of pages to crawl')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent crawl workers')
+    parser.add_argument('--ignore-robots', action='store_true', help='Ignore robots.txt rules')
+    add_politeness_arguments(parser)
+    add_frontier_arguments(parser)
+    add_dedup_arguments(parser)
+    add_transport_arguments(parser)
+    add_stats_arguments(parser)
+    
+    args = parser.parse_args()
+    if args.resume and not args.state_file:
+        parser.error("--resume needs --state-file")
+    if args.offline and not args.archive:
+        parser.error("--offline needs --archive")
+    with collect_stats(args), transport_from_args(args, pool_size=max(args.workers, 10)) as transport:
+        crawl_website(args.url, args.depth, args.workers, args.limit, transport, frontier_from_args(args),
+                      scheduler_from_args(args, transport), detector_from_args(args))
+
+
+if __name__ == "__main__":
+    main()
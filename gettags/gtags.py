@@ -1,30 +1,36 @@
 import requests
-from bs4 import BeautifulSoup
 from tabulate import tabulate
 import argparse
+import os
+import sys
 
-def extract_tags(url, tags):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from kreper.metrics import add_stats_arguments, collect_stats
+from kreper.parser import BACKENDS, backend_available, parse
+from kreper.tables import parse_table
+from kreper.transport import Transport, add_transport_arguments, transport_from_args
+
+def extract_tags(url, tags, transport=None, parser=None):
+    transport = transport or Transport()
     try:
-        response = requests.get(url)
+        response = transport.get(url)
         response.raise_for_status()  # Raise an exception for HTTP errors
     except requests.exceptions.RequestException as err:
         print(f"Request Exception: {err}")
         return
     
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # Only the requested tags are built into the tree
+    soup = parse(response.content, parser, only=tags)
     
     for tag in tags:
         print(f"\nExtracted {tag}s:")
         for i, extracted_tag in enumerate(soup.find_all(tag)):
             print(f"\n{tag} #{i+1}:")
             if tag.lower() == 'table':
-                # Print table in a readable format
-                table_data = [[cell.text.strip() for cell in row.find_all('td')] for row in extracted_tag.find_all('tr')]
-                headers = [cell.text.strip() for cell in extracted_tag.find_all('th')]
-                if headers:
-                    print(tabulate(table_data, headers, tablefmt='grid'))
-                else:
-                    print(tabulate(table_data, tablefmt='grid'))
+                # Print table in a readable format; spans are already expanded into the grid
+                table = parse_table(extracted_tag)
+                if table:
+                    print(tabulate(table['rows'], table['headers'], tablefmt='grid'))
             else:
                 # Print other tags
                 print(extracted_tag.prettify())
@@ -33,10 +39,18 @@ def main():
     parser = argparse.ArgumentParser(description='Tag Extractor')
     parser.add_argument('url', type=str, help='Website URL to extract tags from')
     parser.add_argument('--tags', type=str, nargs='+', default=['form', 'table'], help='Tags to extract (space-separated)')
+    parser.add_argument('--parser', type=str, choices=BACKENDS, default='auto', help='HTML parser backend (auto picks the fastest installed)')
+    add_transport_arguments(parser)
+    add_stats_arguments(parser)
     
     args = parser.parse_args()
-    extract_tags(args.url, args.tags)
+    if not backend_available(args.parser):
+        parser.error(f"parser backend is not installed: {args.parser}")
+    if args.offline and not args.archive:
+        parser.error("--offline needs --archive")
+    with collect_stats(args), transport_from_args(args) as transport:
+        extract_tags(args.url, args.tags, transport, args.parser)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1 @@
+# Shared building blocks for skraper.py, crawl/crawl.py and gettags/gtags.py
@@ -0,0 +1,354 @@
+import base64
+import gzip
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from kreper.metrics import metrics
+from kreper.urls import canonicalize_url
+
+COMPRESSIONS = ('gzip', 'zstd')
+SCAN_CHUNK = 64 * 1024
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_DECOMPRESS_ERRORS = (zlib.error, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+# Headers that describe the bytes on the wire; the archived body is already decoded
+_WIRE_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+class ArchivedPage:
+    def __init__(self, url, status, reason, headers, body, fetched):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.fetched = fetched
+
+
+class PageArchive:
+    """
+    Append-only archive of raw responses. Every response is one WARC
+    'response' record compressed on its own (gzip, or zstd when installed),
+    so any record can be read without touching the rest of the file. A
+    SQLite index next to the archive maps each URL to the offset and length
+    of its latest record, and reads go through a memory map of the file.
+
+    If a run stops between writing a record and committing the index, the
+    records past the last indexed offset are scanned and indexed again on
+    the next open.
+
+    Args:
+    path (str): Archive file, conventionally .warc.gz or .warc.zst.
+    compression (str): 'gzip' or 'zstd', used for new records. Defaults to
+        what the file name suggests.
+    readonly (bool): Open for reading only, as offline runs do.
+    checkpoint_interval (float): Seconds between index commits.
+    """
+
+    def __init__(self, path, compression=None, readonly=False, checkpoint_interval=5.0):
+        self.path = path
+        self.compression = compression or ('zstd' if path.endswith('.zst') else 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.readonly = readonly
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._map = None
+
+        if readonly and not os.path.exists(path):
+            raise FileNotFoundError(f"No archive at {path}")
+        self.file = None if readonly else open(path, 'ab')
+
+        self.db = sqlite3.connect(f"{path}.idx", check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS records ('
+            'url TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL, '
+            'status INTEGER NOT NULL, digest TEXT NOT NULL, fetched TEXT NOT NULL)'
+        )
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'indexed'").fetchone()
+        self._indexed = row[0] if row else 0
+        if os.path.getsize(path) > self._indexed:
+            self._recover()
+        self._last_checkpoint = time.monotonic()
+
+    def store(self, url, response):
+        """
+        Appends a response to the archive, unless the latest record for the
+        URL already holds the same body.
+        """
+        body = response.content or b''
+        digest = 'sha1:' + base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+        key = canonicalize_url(url)
+        with self._lock:
+            row = self.db.execute('SELECT digest FROM records WHERE url = ?', (key,)).fetchone()
+            if row and row[0] == digest:
+                return False
+
+            fetched = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            record = self._compress(_warc_record(url, response, body, digest, fetched))
+            offset = self.file.tell()
+            self.file.write(record)
+            self.file.flush()
+            self.db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)',
+                            (key, offset, len(record), response.status_code, digest, fetched))
+            self._maybe_checkpoint()
+        metrics.incr('archived_bytes', len(record))
+        return True
+
+    def get(self, url):
+        """Returns the latest ArchivedPage for the URL, or None."""
+        with self._lock:
+            row = self.db.execute('SELECT offset, length FROM records WHERE url = ?',
+                                  (canonicalize_url(url),)).fetchone()
+            if row is None:
+                return None
+            offset, length = row
+            data = self._view(offset + length)[offset:offset + length]
+        return _parse_record(self._decompress(data))
+
+    def urls(self, errors=False):
+        """
+        Every archived page URL, oldest record first. robots.txt files, which
+        the politeness rules fetch and archive too, are left out, and so are
+        error responses unless `errors` is set.
+        """
+        query = 'SELECT url FROM records' + ('' if errors else ' WHERE status < 400') + ' ORDER BY rowid'
+        with self._lock:
+            rows = self.db.execute(query).fetchall()
+        return [row[0] for row in rows if urlsplit(row[0]).path != '/robots.txt']
+
+    def merge(self, path):
+        """
+        Appends the records of the archive at `path` and indexes them, as if
+        they had been stored here. A record cut short at its end is left out.
+        """
+        other = PageArchive(path, readonly=True)
+        try:
+            size = other._indexed
+        finally:
+            other.close()
+        if not size:
+            return
+        with self._lock:
+            self._commit()
+            with open(path, 'rb') as f:
+                while size > 0:
+                    chunk = f.read(min(SCAN_CHUNK, size))
+                    if not chunk:
+                        break
+                    self.file.write(chunk)
+                    size -= len(chunk)
+            self.file.flush()
+            self._recover()
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def _view(self, end):
+        # The file only grows, so the map is replaced whenever a record lies beyond it
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _decompress(self, data):
+        if data[:4] == b'\x28\xb5\x2f\xfd':
+            if zstandard is None:
+                raise ValueError("Archive record is zstd compressed, install zstandard to read it")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return gzip.decompress(data)
+
+    def _recover(self):
+        # Index the records appended after the last index commit
+        size = os.path.getsize(self.path)
+        view = self._view(size)
+        offset = self._indexed
+        while offset < size:
+            try:
+                payload, length = _read_member(view, offset)
+            except _DECOMPRESS_ERRORS:
+                # A record cut short by a crash; later appends start after it
+                break
+            page = _parse_record(payload)
+            digest = _warc_headers(payload).get('warc-payload-digest', '')
+            self.db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)',
+                            (canonicalize_url(page.url), offset, length, page.status, digest, page.fetched))
+            offset += length
+        self._indexed = offset
+        self._commit()
+
+    def _maybe_checkpoint(self):
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self._commit()
+
+    def _commit(self):
+        if self.file is not None:
+            self._indexed = self.file.tell()
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed', ?)", (self._indexed,))
+        self.db.commit()
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                self._commit()
+                self.file.close()
+                self.file = None
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_member(view, offset):
+    """
+    Decompresses the record starting at `offset` without knowing its length
+    up front. Returns the payload and the compressed length.
+    """
+    if view[offset:offset + 4] == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            raise EOFError("zstd record and no zstandard package")
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(wbits=31)
+    parts = []
+    position = offset
+    while not decompressor.eof:
+        chunk = view[position:position + SCAN_CHUNK]
+        if not chunk:
+            raise EOFError("archive ends inside a record")
+        parts.append(decompressor.decompress(chunk))
+        position += len(chunk)
+    return b''.join(parts), position - len(decompressor.unused_data) - offset
+
+
+def _warc_record(url, response, body, digest, fetched):
+    reason = response.reason or ''
+    lines = [f"HTTP/1.1 {response.status_code} {reason}"]
+    for name, value in response.headers.items():
+        if name.lower() not in _WIRE_HEADERS:
+            lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    http_block = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace') + body
+
+    header = '\r\n'.join([
+        'WARC/1.1',
+        'WARC-Type: response',
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {fetched}",
+        f"WARC-Target-URI: {url}",
+        f"WARC-Payload-Digest: {digest}",
+        'Content-Type: application/http; msgtype=response',
+        f"Content-Length: {len(http_block)}",
+    ])
+    return header.encode('utf-8') + b'\r\n\r\n' + http_block + b'\r\n\r\n'
+
+
+def _warc_headers(payload):
+    head = payload.split(b'\r\n\r\n', 1)[0].decode('utf-8', 'replace')
+    headers = {}
+    for line in head.split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def _parse_record(payload):
+    head, _, block = payload.partition(b'\r\n\r\n')
+    warc = _warc_headers(head)
+    block = block[:int(warc.get('content-length', len(block)))]
+
+    http_head, _, body = block.partition(b'\r\n\r\n')
+    lines = http_head.decode('latin-1').split('\r\n')
+    _, status, reason = (lines[0].split(' ', 2) + ['', ''])[:3]
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip()] = value.strip()
+    return ArchivedPage(warc.get('warc-target-uri'), int(status), reason, headers, body, warc.get('warc-date'))
+
+
+class ArchiveTransport:
+    """
+    Stand-in for Transport that answers every request from a PageArchive,
+    for offline runs. URLs that were never archived come back as 404.
+
+    Args:
+    archive (PageArchive): Where the pages are read from.
+    headers (dict): Kept for code that reads the session's headers.
+    """
+
+    def __init__(self, archive, headers=None):
+        self.archive = archive
+        self.cache = None
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url, use_cache=True, **kwargs):
+        page = self.archive.get(url)
+        response = requests.Response()
+        response.url = url
+        if page is None:
+            metrics.incr('archive_misses')
+            response.status_code = 404
+            response.reason = 'Not Archived'
+            response._content = b''
+        else:
+            metrics.incr('archive_hits')
+            response.status_code = page.status
+            response.reason = page.reason
+            response.headers = page.headers
+            response._content = page.body
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.from_archive = True
+        return response
+
+    def close(self):
+        self.session.close()
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_archive_arguments(parser):
+    parser.add_argument('--archive', type=str, help='Append every fetched page to this compressed archive (.warc.gz or .warc.zst)')
+    parser.add_argument('--offline', action='store_true', help='Read pages from --archive instead of the network')
+
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from kreper.urls import normalize_url
+
+# Only these headers are replayed on a cache hit; the body is stored decoded
+STORED_HEADERS = ('content-type', 'etag', 'last-modified')
+
+
+class HTTPCache:
+    """
+    On-disk response cache keyed by normalized URL. Entries keep the body
+    plus the ETag/Last-Modified validators, so later runs send conditional
+    requests and an unchanged page costs a 304 and a local read.
+
+    Args:
+    directory (str): Where the cache lives.
+    max_age (float): Evict entries not used for this many seconds.
+    max_size (int): Evict least recently used entries above this many bytes.
+    """
+
+    def __init__(self, directory, max_age=None, max_size=None):
+        self.directory = os.path.expanduser(directory)
+        self.max_age = max_age
+        self.max_size = max_size
+        self._stores = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict()
+
+    def _paths(self, url):
+        key = hashlib.sha256(normalize_url(url).encode()).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.json", f"{base}.body"
+
+    def lookup(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last-modified'):
+            headers['If-Modified-Since'] = entry['last-modified']
+        return headers
+
+    def read_body(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        # Touch the entry so LRU eviction sees it as recently used
+        now = time.time()
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+        return body
+
+    def store(self, url, response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        if 'etag' not in headers and 'last-modified' not in headers:
+            # Nothing to revalidate with, so caching would not save a transfer
+            return
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        entry = dict(headers, url=url, size=len(response.content), stored=time.time())
+        _atomic_write(body_path, response.content)
+        _atomic_write(meta_path, json.dumps(entry).encode('utf-8'))
+
+        with self._lock:
+            self._stores += 1
+            evict = self._stores % 100 == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        if self.max_age is None and self.max_size is None:
+            return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    used = os.path.getmtime(meta_path)
+                    size = os.path.getsize(body_path)
+                except OSError:
+                    size = 0
+                    used = 0
+                entries.append((used, size, meta_path, body_path))
+
+        entries.sort()
+        total = sum(size for _, size, _, _ in entries)
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+        for used, size, meta_path, body_path in entries:
+            expired = cutoff is not None and used < cutoff
+            oversized = self.max_size is not None and total > self.max_size
+            if not expired and not oversized:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+from kreper.dedup import Duplicate
+from kreper.frontier import MemoryFrontier
+from kreper.metrics import metrics
+from kreper.urls import absolute_link, canonicalize_url
+
+# Seconds between checks of a shared frontier that is empty for now, or of a stop request
+POLL_INTERVAL = 0.5
+
+
+def page_links(soup, base_url):
+    """
+    Returns the absolute http(s) links of a parsed page, without fragments.
+    """
+    links = []
+    for link in soup.find_all('a', href=True):
+        href = absolute_link(link['href'], base_url)
+        if href:
+            links.append(href)
+    return links
+
+
+class Crawler:
+    """
+    Breadth-first crawler over a shared frontier with a bounded number of
+    concurrent workers. Blocking fetch/parse work runs in a thread pool,
+    so up to `workers` pages are in flight at any time. URLs are
+    canonicalized before they reach the frontier, so each page is visited
+    under one spelling only.
+
+    Args:
+    visit (callable): visit(url, depth) -> (result, links) or None. Runs in a
+        worker thread and does the fetching and parsing for one page. It may
+        return a Duplicate instead, then the page is neither processed nor
+        expanded.
+    depth (int): Maximum link depth to follow from the seeds (0 = seeds only).
+    limit (int): Maximum number of pages to visit.
+    workers (int): Number of concurrent workers.
+    on_page (callable): on_page(url, depth, result), called on the event loop
+        for every page that was visited successfully.
+    on_duplicate (callable): on_duplicate(url, depth, duplicate), called for
+        every page visit() reported as a Duplicate.
+    process (callable): Optional CPU-bound stage. When set, visit() only
+        fetches and returns a payload, and process(url, payload) -> (result,
+        links) runs in a pool of `process_workers` processes. Must be picklable.
+    process_workers (int): Size of the process pool.
+    process_pool (ProcessPoolExecutor): Existing pool to run process() in
+        instead of starting one per crawl, so its processes stay warm.
+    frontier: Where queued and seen URLs live, a MemoryFrontier by default.
+        The crawl ends once the frontier is empty and frontier.finished()
+        agrees, which a frontier shared with other processes only does
+        when none of them can add more work.
+    scheduler (PolitenessScheduler): Optional robots.txt and per-host rate
+        rules. URLs whose host is not due yet are parked while the workers
+        move on to other hosts.
+    stop (threading.Event): Ends the crawl early once set, from any thread.
+        Pages already in flight are finished.
+    """
+
+    def __init__(self, visit, depth=0, limit=100, workers=8, on_page=None, process=None, process_workers=0,
+                 frontier=None, scheduler=None, on_duplicate=None, process_pool=None, stop=None):
+        self.visit = visit
+        self.depth = depth
+        self.limit = limit
+        self.workers = max(1, workers)
+        self.on_page = on_page
+        self.on_duplicate = on_duplicate
+        self.process = process if process_workers > 0 else None
+        self.process_workers = process_workers
+        self.process_pool = process_pool
+        self.frontier = frontier or MemoryFrontier()
+        self.scheduler = scheduler
+        self.stop = stop
+        self.pages = 0
+        self.blocked = 0
+        self.duplicates = 0
+        self.errors = []
+        # (due time, sequence, url, depth) of URLs waiting for their host
+        self._parked = []
+        self._sequence = itertools.count()
+        self._max_parked = self.workers * 32
+
+    def run(self, seeds):
+        try:
+            return asyncio.run(self.crawl(seeds))
+        finally:
+            self.frontier.close()
+
+    async def crawl(self, seeds):
+        loop = asyncio.get_running_loop()
+        self._active = 0
+        self._changed = asyncio.Condition()
+        for url in seeds:
+            self._enqueue(url, 0)
+
+        if self.process:
+            pool = self.process_pool or ProcessPoolExecutor(max_workers=self.process_workers)
+            # Backpressure: fetchers wait here while the parse stage is full,
+            # so fetched bodies never pile up faster than they are processed
+            self._backlog = asyncio.Semaphore(self.process_workers * 2)
+        else:
+            pool = None
+        # A pool handed in outlives the crawl
+        owned = pool if pool is not None and pool is not self.process_pool else nullcontext()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, owned:
+            await asyncio.gather(*(self._worker(loop, executor, pool) for _ in range(self.workers)))
+        return self.pages
+
+    def _duplicate(self, url, depth, duplicate):
+        # Visited, but nothing is extracted from it and its links are not followed
+        self.frontier.done(url)
+        self.duplicates += 1
+        if self.on_duplicate:
+            self.on_duplicate(url, depth, duplicate)
+
+    def _enqueue(self, url, depth):
+        if self.frontier.seen_count() >= self.limit:
+            return
+        try:
+            url = canonicalize_url(url)
+        except ValueError:
+            # One malformed link must not end the crawl
+            metrics.incr('bad_links')
+            return
+        self.frontier.add(url, depth)
+
+    async def _next(self):
+        # Waits for work; returns None once the frontier is empty and no
+        # page in flight can add to it any more
+        async with self._changed:
+            while True:
+                if self.stop is not None and self.stop.is_set():
+                    self._changed.notify_all()
+                    return None
+                now = time.monotonic()
+                if self._parked and self._parked[0][0] <= now:
+                    _, _, url, depth = heapq.heappop(self._parked)
+                    self._active += 1
+                    return url, depth, True
+
+                item = self.frontier.pop() if len(self._parked) < self._max_parked else None
+                if item is not None:
+                    if self.scheduler and not self.scheduler.ready(item[0]):
+                        # The host's Crawl-delay is unknown until _visit has
+                        # loaded its robots.txt; the slot is booked there
+                        self._active += 1
+                        return item + (False,)
+                    delay = self.scheduler.reserve(item[0]) if self.scheduler else 0
+                    if delay <= 0:
+                        self._active += 1
+                        return item + (True,)
+                    heapq.heappush(self._parked, (now + delay, next(self._sequence)) + item)
+                    continue
+
+                if not self._parked and not self._active:
+                    if self.frontier.finished():
+                        self._changed.notify_all()
+                        return None
+                    # Other crawlers sharing the frontier may still add work for us
+                    timeout = POLL_INTERVAL
+                else:
+                    timeout = self._parked[0][0] - now if self._parked else None
+                if self.stop is not None:
+                    # The stop event cannot wake the loop, so look at it regularly
+                    timeout = POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL)
+                await self._wait(timeout)
+
+    async def _wait(self, timeout):
+        # Not asyncio.wait_for: before Python 3.12 it can swallow a
+        # cancellation that races with its timeout, and Ctrl-C then hangs
+        # the crawl. A timer wakes the waiters instead.
+        loop = asyncio.get_running_loop()
+        timer = loop.call_later(timeout, lambda: loop.create_task(self._wake())) if timeout is not None else None
+        try:
+            await self._changed.wait()
+        finally:
+            if timer:
+                timer.cancel()
+
+    async def _wake(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _worker(self, loop, executor, pool):
+        while True:
+            item = await self._next()
+            if item is None:
+                return
+            url, depth, reserved = item
+            try:
+                await self._visit(loop, executor, pool, url, depth, reserved)
+            finally:
+                async with self._changed:
+                    self._active -= 1
+                    self._changed.notify_all()
+
+    async def _visit(self, loop, executor, pool, url, depth, reserved):
+        try:
+            if self.scheduler and not await loop.run_in_executor(executor, self.scheduler.allowed, url):
+                self.blocked += 1
+                metrics.incr('robots_blocked')
+                self.frontier.done(url, ok=False)
+                return
+            if not reserved:
+                delay = self.scheduler.reserve(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            outcome = await loop.run_in_executor(executor, self.visit, url, depth)
+            if isinstance(outcome, Duplicate):
+                self._duplicate(url, depth, outcome)
+                return
+            if outcome is not None and self.process:
+                async with self._backlog:
+                    # Parse workers record into their own process, so time the hand-off from here
+                    with metrics.timer('process'):
+                        outcome = await loop.run_in_executor(pool, self.process, url, outcome)
+        except Exception as e:
+            # A broken page must not take its worker down with it
+            self.errors.append((url, e))
+            metrics.incr('errors')
+            outcome = None
+        if outcome is None:
+            self.frontier.done(url, ok=False)
+            return
+
+        result, links = outcome
+        # Links are queued and records handed on before the page is marked
+        # done, so a shared frontier never looks drained while this page's
+        # links are missing, and a resumed crawl never skips a page whose
+        # records were not written
+        if depth < self.depth:
+            for link in links:
+                self._enqueue(link, depth + 1)
+        if self.on_page:
+            self.on_page(url, depth, result)
+        self.frontier.done(url)
+        self.pages += 1
+        metrics.incr('pages')
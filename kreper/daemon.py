@@ -0,0 +1,255 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Only the standard library is imported here, so the client below starts
+# fast; the HTTP server is in kreper.daemon_http, imported by serve()
+
+DEFAULT_WORKERS = 4
+# Finished jobs kept for status queries; older ones are forgotten
+HISTORY = 1000
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+_TCP_RE = re.compile(r'^(http://)?([\w.-]*):(\d+)/?$')
+
+
+class JobError(Exception):
+    """A job's command line is invalid. Reported to the client, the daemon keeps running."""
+
+
+class Job:
+    def __init__(self, id, argv, args):
+        self.id = id
+        self.argv = argv
+        self.args = args
+        self.state = 'queued'
+        self.submitted = _now()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = {}
+        # Set to cancel: a queued job never starts, a running crawl stops after the pages in flight
+        self.stop = threading.Event()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'args': self.argv,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+            'output': self.result.get('output'),
+            'records': len(self.result.get('records') or []),
+        }
+
+
+class KreperDaemon:
+    """
+    Resident job server. Jobs are skraper.py command lines, run a few at a
+    time in one long-lived process, so interpreter start-up, imports, the
+    connection pool, robots.txt rules and parser processes are paid for
+    once instead of once per job. Jobs are submitted, watched and
+    cancelled over a small JSON-over-HTTP API, served on a Unix socket or a
+    TCP port:
+
+        GET  /status              daemon uptime and job counts
+        GET  /jobs                every known job
+        POST /jobs                {"args": [...]}, add ?wait=1 to block until it ends
+        GET  /jobs/<id>           one job
+        GET  /jobs/<id>/records   records of a job run without --output
+        POST /jobs/<id>/cancel    cancel a job (DELETE /jobs/<id> does the same)
+
+    Args:
+    parse (callable): parse(argv) -> args. Raises JobError for a bad command line.
+    run (callable): run(args, stop) runs one job and returns a dict, with
+        'output' and/or 'records'. `stop` is set when the job is cancelled.
+    workers (int): Jobs run at the same time.
+    status (callable): Optional, returns extra fields for /status.
+    """
+
+    def __init__(self, parse, run, workers=DEFAULT_WORKERS, status=None):
+        self.parse = parse
+        self.run = run
+        self.workers = max(1, workers)
+        self.extra_status = status
+        self.jobs = {}
+        self.started = time.monotonic()
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.server = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, argv):
+        if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+            raise JobError("args must be a list of strings")
+        args = self.parse(argv)
+        with self._lock:
+            job = Job(str(next(self._ids)), argv, args)
+            self.jobs[job.id] = job
+            self._forget_old()
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.stop.is_set():
+                job.state = 'cancelled'
+                job.finished = _now()
+                job.done.set()
+                return
+            job.state = 'running'
+            job.started = _now()
+        try:
+            job.result = self.run(job.args, job.stop) or {}
+            state = 'cancelled' if job.stop.is_set() else 'done'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            state = 'failed'
+        except SystemExit as e:
+            # argparse inside a job (a .krp script line) gives up this way
+            job.error = f"exited with status {e.code}"
+            state = 'failed'
+        with self._lock:
+            job.state = state
+            job.finished = _now()
+        job.done.set()
+
+    def get(self, id):
+        with self._lock:
+            return self.jobs.get(id)
+
+    def cancel(self, id):
+        job = self.get(id)
+        if job is not None:
+            job.stop.set()
+        return job
+
+    def status(self):
+        with self._lock:
+            counts = dict.fromkeys(JOB_STATES, 0)
+            for job in self.jobs.values():
+                counts[job.state] += 1
+        status = {'uptime_s': round(time.monotonic() - self.started, 3), 'workers': self.workers, 'jobs': counts}
+        if self.extra_status:
+            status.update(self.extra_status())
+        return status
+
+    def _forget_old(self):
+        finished = [job for job in self.jobs.values() if job.done.is_set()]
+        for job in finished[:max(0, len(finished) - HISTORY)]:
+            del self.jobs[job.id]
+
+    def serve(self, address):
+        """
+        Serves the API on `address` (a Unix socket path, or host:port) until
+        interrupted, then cancels the jobs and waits for the running ones.
+        """
+        from kreper.daemon_http import UnixHTTPServer, make_server
+
+        self.server = make_server(address, self)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if isinstance(self.server, UnixHTTPServer):
+                os.remove(self.server.server_address)
+            self.close()
+
+    def close(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.stop.set()
+        self.executor.shutdown(wait=True)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def request(address, method, path, payload=None, timeout=None):
+    """
+    Sends one API request to the daemon at `address` and returns (status,
+    decoded JSON reply).
+    """
+    match = _TCP_RE.match(address)
+    if match:
+        connection = http.client.HTTPConnection(match.group(2) or '127.0.0.1', int(match.group(3)), timeout=timeout)
+    else:
+        connection = _UnixConnection(address, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    finally:
+        connection.close()
+
+
+def add_daemon_arguments(parser):
+    parser.add_argument('--serve', type=str, metavar='ADDRESS', help='Run as a daemon serving jobs on this Unix socket path or host:port')
+    parser.add_argument('--daemon-workers', type=int, default=DEFAULT_WORKERS, help='Jobs the daemon runs at the same time')
+
+
+def main(argv=None):
+    """
+    Command-line client for a running daemon:
+
+        python -m kreper.daemon ADDRESS submit [--wait] -- -u URL --extract h1
+        python -m kreper.daemon ADDRESS status [JOB]
+        python -m kreper.daemon ADDRESS records JOB
+        python -m kreper.daemon ADDRESS cancel JOB
+    """
+    parser = argparse.ArgumentParser(description="Kreper daemon client")
+    parser.add_argument('address', help='Unix socket path or host:port of the daemon')
+    commands = parser.add_subparsers(dest='command', required=True)
+    submit = commands.add_parser('submit', help='Submit a job (skraper.py options)')
+    submit.add_argument('--wait', action='store_true', help='Wait for the job to end')
+    submit.add_argument('args', nargs=argparse.REMAINDER, help='Options of the job')
+    status = commands.add_parser('status', help='Daemon status, or the status of one job')
+    status.add_argument('job', nargs='?')
+    commands.add_parser('jobs', help='List the known jobs')
+    for name, help in (('records', 'Records of a job run without --output'), ('cancel', 'Cancel a job')):
+        commands.add_parser(name, help=help).add_argument('job')
+    args = parser.parse_args(argv)
+
+    if args.command == 'submit':
+        job_args = args.args[1:] if args.args[:1] == ['--'] else args.args
+        code, reply = request(args.address, 'POST', '/jobs?wait=1' if args.wait else '/jobs', {'args': job_args})
+    elif args.command == 'status':
+        code, reply = request(args.address, 'GET', f"/jobs/{args.job}" if args.job else '/status')
+    elif args.command == 'jobs':
+        code, reply = request(args.address, 'GET', '/jobs')
+    elif args.command == 'records':
+        code, reply = request(args.address, 'GET', f"/jobs/{args.job}/records")
+    else:
+        code, reply = request(args.address, 'POST', f"/jobs/{args.job}/cancel")
+    print(json.dumps(reply, indent=2, ensure_ascii=False))
+    if code >= 400 or reply.get('state') == 'failed':
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
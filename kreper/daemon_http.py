@@ -0,0 +1,107 @@
+import json
+import os
+import socket
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from kreper.daemon import _TCP_RE, JobError
+
+# The daemon's HTTP side, only imported by a process that serves jobs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    daemon = None
+
+    def do_GET(self):
+        parts = self._parts()
+        if parts == ['status']:
+            return self._reply(200, self.daemon.status())
+        if parts == ['jobs']:
+            with self.daemon._lock:
+                jobs = [job.to_dict() for job in self.daemon.jobs.values()]
+            return self._reply(200, {'jobs': jobs})
+        job = self._job(parts)
+        if job is None:
+            return
+        if len(parts) == 2:
+            return self._reply(200, job.to_dict())
+        if parts[2:] == ['records']:
+            return self._reply(200, {'id': job.id, 'state': job.state, 'records': job.result.get('records') or []})
+        self._reply(404, {'error': f"no such endpoint: {self.path}"})
+
+    def do_POST(self):
+        parts = self._parts()
+        if parts == ['jobs']:
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                job = self.daemon.submit(body.get('args'))
+            except (ValueError, AttributeError) as e:
+                return self._reply(400, {'error': f"invalid request body: {e}"})
+            except JobError as e:
+                return self._reply(400, {'error': str(e)})
+            except SystemExit as e:
+                # Whatever in parse() gives up this way must not take the handler thread with it
+                return self._reply(400, {'error': f"job exited with status {e.code}"})
+            if 'wait=1' in self.path.partition('?')[2].split('&'):
+                job.done.wait()
+            return self._reply(200 if job.done.is_set() else 202, job.to_dict())
+        if len(parts) == 3 and parts[2] == 'cancel':
+            return self._cancel(parts)
+        self._reply(404, {'error': f"no such endpoint: {self.path}"})
+
+    def do_DELETE(self):
+        self._cancel(self._parts())
+
+    def _cancel(self, parts):
+        job = self._job(parts)
+        if job is not None:
+            self.daemon.cancel(job.id)
+            self._reply(202, job.to_dict())
+
+    def _parts(self):
+        return [part for part in self.path.partition('?')[0].split('/') if part]
+
+    def _job(self, parts):
+        job = self.daemon.get(parts[1]) if len(parts) >= 2 and parts[0] == 'jobs' else None
+        if job is None:
+            self._reply(404, {'error': f"no such job: {self.path}"})
+        return job
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(address, daemon):
+    handler = type('Handler', (_Handler,), {'daemon': daemon})
+    match = _TCP_RE.match(address)
+    if match:
+        server = ThreadingHTTPServer((match.group(2) or '127.0.0.1', int(match.group(3))), handler)
+        server.daemon_threads = True
+        return server
+
+    if os.path.exists(address):
+        # A socket left behind by a daemon that died is replaced, a live one is not
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(address)
+        except OSError:
+            os.remove(address)
+        else:
+            raise OSError(f"A daemon is already listening on {address}")
+    return UnixHTTPServer(address, handler)
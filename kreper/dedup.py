@@ -0,0 +1,134 @@
+import hashlib
+import re
+import threading
+
+from kreper.metrics import metrics
+from kreper.parser import text_nodes
+
+SIMHASH_BITS = 64
+DEFAULT_DISTANCE = 3
+# Pages with fewer shingles than this are only compared exactly
+MIN_SHINGLES = 16
+SHINGLE_SIZE = 3
+
+_WORD_RE = re.compile(r'\w+')
+
+
+class Duplicate:
+    """
+    Returned for a page whose content was already seen under another URL.
+
+    Args:
+    url (str): The duplicate page.
+    original (str): The first page seen with this content.
+    distance (int): Hamming distance between the SimHashes of the two pages.
+    exact (bool): The bodies are byte for byte identical.
+    """
+
+    def __init__(self, url, original, distance=0, exact=False):
+        self.url = url
+        self.original = original
+        self.distance = distance
+        self.exact = exact
+
+
+def simhash(text):
+    """
+    Returns the 64-bit SimHash of the word shingles of `text`, or None when
+    the text is too short for the hash to mean anything. Pages that differ
+    only a little get hashes that differ in only a few bits.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+              for shingle in shingles]
+    half = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(SIMHASH_BITS):
+        mask = 1 << bit
+        if sum(1 for h in hashes if h & mask) > half:
+            fingerprint |= mask
+    return fingerprint
+
+
+class DuplicateDetector:
+    """
+    Spots pages whose content was already seen during a crawl: identical
+    bodies by a SHA-256 of the raw bytes, near-duplicates by the SimHash of
+    their text. Safe to share between worker threads.
+
+    Near-duplicate lookups use the pigeonhole trick: the hash is split into
+    distance + 1 blocks, and two hashes within `distance` bits of each other
+    must agree on at least one block, so only pages sharing a block are
+    compared.
+
+    Args:
+    distance (int): Largest Hamming distance (out of 64 bits) that counts as
+        a near-duplicate. 0 only catches identical bodies.
+    """
+
+    def __init__(self, distance=DEFAULT_DISTANCE):
+        self.distance = max(0, min(distance, SIMHASH_BITS // 4 - 1))
+        self.bodies = {}
+        self.blocks = self.distance + 1 if self.distance else 0
+        self.block_bits = SIMHASH_BITS // self.blocks if self.blocks else 0
+        # One {block value: [(simhash, url)]} table per block
+        self.tables = [{} for _ in range(self.blocks)]
+        self._lock = threading.Lock()
+
+    def check(self, url, body, encoding=None):
+        """
+        Returns a Duplicate when the page was already seen, otherwise
+        remembers it as an original and returns None.
+        """
+        digest = hashlib.sha256(body).digest()
+        with self._lock:
+            original = self.bodies.get(digest)
+            if original is None:
+                self.bodies[digest] = url
+        if original is not None:
+            return self._record(Duplicate(url, original, exact=True))
+        if not self.blocks:
+            return None
+
+        with metrics.timer('simhash'):
+            fingerprint = simhash(' '.join(text_nodes(body, encoding)))
+        if fingerprint is None:
+            return None
+
+        keys = self._blocks(fingerprint)
+        with self._lock:
+            match = self._nearest(fingerprint, keys)
+            if match is None:
+                for table, key in zip(self.tables, keys):
+                    table.setdefault(key, []).append((fingerprint, url))
+                return None
+        original, distance = match
+        return self._record(Duplicate(url, original, distance))
+
+    def _blocks(self, fingerprint):
+        mask = (1 << self.block_bits) - 1
+        return [(fingerprint >> (i * self.block_bits)) & mask for i in range(self.blocks)]
+
+    def _nearest(self, fingerprint, keys):
+        for table, key in zip(self.tables, keys):
+            for other, url in table.get(key, ()):
+                distance = bin(fingerprint ^ other).count('1')
+                if distance <= self.distance:
+                    return url, distance
+        return None
+
+    def _record(self, duplicate):
+        metrics.incr('duplicates', kind='exact' if duplicate.exact else 'near')
+        return duplicate
+
+
+def add_dedup_arguments(parser):
+    parser.add_argument('--dedup', action='store_true', help='Skip crawled pages whose content was already seen under another URL')
+    parser.add_argument('--dedup-distance', type=int, default=DEFAULT_DISTANCE, help='Bits of SimHash difference still counted as a near-duplicate (0 = identical pages only)')
+
+
+def detector_from_args(args):
+    return DuplicateDetector(args.dedup_distance) if args.dedup else None
@@ -0,0 +1,458 @@
+import hashlib
+import importlib.util
+import json
+import os
+import socket
+import sqlite3
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from kreper.frontier import ACTIVE, DONE, FAILED, QUEUED
+
+# Seconds between refreshes of the crawl-wide seen count
+COUNT_REFRESH = 0.5
+
+
+
+def host_partition(url, partitions):
+    """
+    Returns the partition that owns the URL's host. Stable across processes
+    and machines, so every worker agrees on who crawls which host.
+    """
+    host = urlsplit(url).netloc.lower()
+    return int.from_bytes(hashlib.blake2b(host.encode('utf-8'), digest_size=8).digest(), 'big') % partitions
+
+
+class SharedFrontier:
+    """
+    Frontier shared by several crawler processes. URLs are routed to the
+    partition of their host and each worker only pops from the partition it
+    owns, so every host is crawled by exactly one worker and its politeness
+    rules hold, while the workers together cover all hosts in parallel.
+
+    Links found on a page are buffered and stored together with the page's
+    completion, so other workers never see the frontier drained while a
+    page's links are still on their way. The crawl is finished once no
+    partition has queued or in-flight URLs left. The page limit is checked
+    by the store in the same transaction that adds the links, so it holds
+    exactly however many workers add at once. `before_commit`, when set,
+    runs before a page is stored as done, so its output can be put on disk
+    first.
+
+    Subclasses provide the store: SqliteSharedFrontier for workers on one
+    machine or a shared disk, RedisSharedFrontier for workers on several.
+    """
+
+    def __init__(self, partition, partitions, limit=None):
+        self.partition = partition
+        self.partitions = partitions
+        self.limit = limit
+        self.before_commit = None
+        self._adds = []
+        self._count = 0
+        self._counted = 0.0
+
+    def add(self, url, depth):
+        self._adds.append((url, depth, host_partition(url, self.partitions)))
+        return True
+
+    def done(self, url, ok=True):
+        if self.before_commit:
+            self.before_commit()
+        adds, self._adds = self._adds, []
+        self._count += self._finish(url, DONE if ok else FAILED, adds)
+
+    def pop(self):
+        if self._adds:
+            # Seeds queued outside a page visit
+            self._count += self._finish(None, None, self._adds)
+            self._adds = []
+        return self._claim()
+
+    def seen_count(self):
+        # Only approximate across workers, refreshed a few times a second;
+        # it spares the crawler adds the store would refuse anyway
+        now = time.monotonic()
+        if now - self._counted >= COUNT_REFRESH:
+            self._count = self._seen()
+            self._counted = now
+        return self._count + len(self._adds)
+
+    def checkpoint(self):
+        pass
+
+
+class SqliteSharedFrontier(SharedFrontier):
+    """
+    Shared frontier in one SQLite file (WAL mode), for worker processes on
+    the same machine or on a filesystem with working locks.
+
+    Args:
+    path (str): SQLite database file.
+    partition (int): Partition owned by this worker.
+    partitions (int): Number of partitions (workers) in the crawl.
+    limit (int): Most URLs the whole crawl may see, or None.
+    batch (int): URLs claimed from the database per query.
+    """
+
+    def __init__(self, path, partition, partitions, limit=None, batch=64):
+        super().__init__(partition, partitions, limit)
+        self.batch = batch
+        self.db = _connect(path)
+        self._claimed = deque()
+
+    def _finish(self, url, state, adds):
+        with self.db:
+            # Taking the write lock up front keeps the count exact until the commit
+            self.db.execute('BEGIN IMMEDIATE')
+            room = None if self.limit is None else self.limit - self._seen()
+            added = 0
+            for link, depth, partition in adds:
+                if room is not None and added >= room:
+                    break
+                cursor = self.db.execute(
+                    'INSERT OR IGNORE INTO urls (url, depth, partition, state) VALUES (?, ?, ?, ?)',
+                    (link, depth, partition, QUEUED))
+                added += cursor.rowcount
+            if url is not None:
+                self.db.execute('UPDATE urls SET state = ? WHERE url = ?', (state, url))
+        return added
+
+    def _claim(self):
+        if not self._claimed:
+            # Only this worker claims from its partition, so select-then-update is safe
+            with self.db:
+                rows = self.db.execute(
+                    'SELECT rowid, url, depth FROM urls WHERE partition = ? AND state = ? ORDER BY rowid LIMIT ?',
+                    (self.partition, QUEUED, self.batch)).fetchall()
+                self.db.executemany('UPDATE urls SET state = ? WHERE rowid = ?', [(ACTIVE, row[0]) for row in rows])
+            self._claimed.extend((url, depth) for _, url, depth in rows)
+        return self._claimed.popleft() if self._claimed else None
+
+    def _seen(self):
+        # rowids are handed out in order and never reused here, so this is the row count
+        return self.db.execute('SELECT COALESCE(MAX(rowid), 0) FROM urls').fetchone()[0]
+
+    def finished(self):
+        return self.db.execute('SELECT 1 FROM urls WHERE state IN (?, ?) LIMIT 1', (QUEUED, ACTIVE)).fetchone() is None
+
+    def visited_urls(self):
+        return [row[0] for row in self.db.execute('SELECT url FROM urls WHERE state = ? ORDER BY rowid', (DONE,))]
+
+    def close(self):
+        # Claimed but unvisited URLs go back to the queue
+        with self.db:
+            self.db.executemany('UPDATE urls SET state = ? WHERE url = ?', [(QUEUED, url) for url, _ in self._claimed])
+            self.db.execute('UPDATE workers SET finished = 1 WHERE partition = ?', (self.partition,))
+        self._claimed.clear()
+        self.db.close()
+
+
+class RedisSharedFrontier(SharedFrontier):
+    """
+    Shared frontier in Redis (or any server speaking its protocol), for
+    workers on several machines. Each partition has a queue list and an
+    in-flight list; popping moves an item between them atomically, and a
+    page's links and its completion are applied in one MULTI/EXEC.
+
+    Args:
+    client: redis.Redis connection.
+    namespace (str): Prefix of every key this crawl uses.
+    partition (int): Partition owned by this worker.
+    partitions (int): Number of partitions (workers) in the crawl.
+    limit (int): Most URLs the whole crawl may see, or None.
+    """
+
+    def __init__(self, client, namespace, partition, partitions, limit=None):
+        super().__init__(partition, partitions, limit)
+        self.client = client
+        self.namespace = namespace
+        # url -> the exact item string in the in-flight list, needed to remove it
+        self._items = {}
+
+    def _key(self, *parts):
+        return ':'.join((self.namespace,) + tuple(str(part) for part in parts))
+
+    def _finish(self, url, state, adds):
+        if self.limit is not None:
+            return self._finish_limited(url, state, adds)
+        new = []
+        if adds:
+            pipe = self.client.pipeline(transaction=False)
+            for link, _, _ in adds:
+                pipe.sadd(self._key('seen'), link)
+            new = [add for add, fresh in zip(adds, pipe.execute()) if fresh]
+
+        pipe = self.client.pipeline(transaction=True)
+        self._queue(pipe, url, state, new)
+        pipe.execute()
+        return len(new)
+
+    def _finish_limited(self, url, state, adds):
+        from redis.exceptions import WatchError
+
+        seen = self._key('seen')
+        # Each link once, in the order it was found
+        unique = {}
+        for add in adds:
+            unique.setdefault(add[0], add)
+        adds = list(unique.values())
+        with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # The seen set is watched, so the count, the membership
+                    # test and the adds are one step: another worker adding
+                    # in between makes EXEC fail, and this is retried
+                    pipe.watch(seen)
+                    new = []
+                    if adds:
+                        known = pipe.smismember(seen, [link for link, _, _ in adds])
+                        new = [add for add, present in zip(adds, known) if not present]
+                        new = new[:max(0, self.limit - pipe.scard(seen))]
+                    pipe.multi()
+                    if new:
+                        pipe.sadd(seen, *(link for link, _, _ in new))
+                    self._queue(pipe, url, state, new)
+                    pipe.execute()
+                    return len(new)
+                except WatchError:
+                    continue
+
+    def _queue(self, pipe, url, state, new):
+        for link, depth, partition in new:
+            pipe.rpush(self._key('queue', partition), json.dumps([link, depth]))
+        if url is not None:
+            pipe.lrem(self._key('active', self.partition), 1, self._items.pop(url))
+            pipe.sadd(self._key('done' if state == DONE else 'failed'), url)
+
+    def _claim(self):
+        item = self.client.lmove(self._key('queue', self.partition), self._key('active', self.partition),
+                                 'LEFT', 'RIGHT')
+        if item is None:
+            return None
+        item = item.decode('utf-8') if isinstance(item, bytes) else item
+        url, depth = json.loads(item)
+        self._items[url] = item
+        return url, depth
+
+    def _seen(self):
+        return self.client.scard(self._key('seen'))
+
+    def finished(self):
+        # One atomic snapshot of every queue and in-flight list
+        pipe = self.client.pipeline(transaction=True)
+        for partition in range(self.partitions):
+            pipe.llen(self._key('queue', partition))
+            pipe.llen(self._key('active', partition))
+        return not any(pipe.execute())
+
+    def visited_urls(self):
+        return sorted(member.decode('utf-8') if isinstance(member, bytes) else member
+                      for member in self.client.smembers(self._key('done')))
+
+    def close(self):
+        # Claimed but unvisited URLs go back to the front of the queue
+        pipe = self.client.pipeline(transaction=True)
+        for item in self._items.values():
+            pipe.lrem(self._key('active', self.partition), 1, item)
+            pipe.lpush(self._key('queue', self.partition), item)
+        pipe.hset(self._key('finished'), self.partition, 1)
+        pipe.execute()
+        self._items.clear()
+
+
+class SharedStore:
+    """
+    Coordinator-side view of a shared frontier: sets a crawl up, hands
+    partitions to joining workers and reports progress.
+
+    Args:
+    spec (str): Path of a SQLite file, or a redis:// URL. The URL fragment
+        names the crawl's key namespace (redis://host:6379/0#mycrawl).
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        if _is_redis(spec):
+            if not shared_store_available(spec):
+                raise ValueError("A Redis frontier needs the redis package")
+            import redis
+            address, _, name = spec.partition('#')
+            self.client = redis.Redis.from_url(address)
+            self.namespace = f"kreper:{name or 'crawl'}"
+            self.db = None
+        else:
+            self.client = None
+            self.db = _connect(spec)
+
+    def _key(self, *parts):
+        return ':'.join((self.namespace,) + tuple(str(part) for part in parts))
+
+    def prepare(self, partitions, resume=False, limit=None):
+        """
+        Starts a crawl over `partitions` workers, or with `resume` picks up
+        the one stored here, putting URLs that were in flight back in their
+        queues. `limit` caps the URLs the whole crawl sees.
+        """
+        if self.client is not None:
+            if not resume:
+                keys = list(self.client.scan_iter(match=self._key('*')))
+                if keys:
+                    self.client.delete(*keys)
+            else:
+                for partition in range(partitions):
+                    while self.client.lmove(self._key('active', partition), self._key('queue', partition),
+                                            'RIGHT', 'LEFT'):
+                        pass
+            self.client.delete(self._key('workers'), self._key('finished'), self._key('limit'))
+            self.client.set(self._key('partitions'), partitions)
+            if limit is not None:
+                self.client.set(self._key('limit'), limit)
+            return
+
+        with self.db:
+            if not resume:
+                self.db.execute('DELETE FROM urls')
+            self.db.execute('UPDATE urls SET state = ? WHERE state = ?', (QUEUED, ACTIVE))
+            self.db.execute('DELETE FROM workers')
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('partitions', ?)", (partitions,))
+            self.db.execute("DELETE FROM meta WHERE key = 'limit'")
+            if limit is not None:
+                self.db.execute("INSERT INTO meta VALUES ('limit', ?)", (limit,))
+
+    def seed(self, urls):
+        partitions = self.partitions()
+        for url in urls:
+            partition = host_partition(url, partitions)
+            if self.client is not None:
+                if self.client.sadd(self._key('seen'), url):
+                    self.client.rpush(self._key('queue', partition), json.dumps([url, 0]))
+            else:
+                with self.db:
+                    self.db.execute('INSERT OR IGNORE INTO urls (url, depth, partition, state) VALUES (?, 0, ?, ?)',
+                                    (url, partition, QUEUED))
+
+    def partitions(self):
+        value = self._setting('partitions')
+        if value is None:
+            raise ValueError(f"No crawl has been set up in {self.spec}")
+        return value
+
+    def limit(self):
+        return self._setting('limit')
+
+    def _setting(self, name):
+        if self.client is not None:
+            value = self.client.get(self._key(name))
+        else:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (name,)).fetchone()
+            value = row[0] if row else None
+        return None if value is None else int(value)
+
+    def join(self, partition=None):
+        """
+        Registers a worker and returns its SharedFrontier. Without a
+        partition number the first one nobody owns is taken. Naming a
+        partition takes it over even if it has an owner, which is how the
+        work of a worker that died is picked up again.
+        """
+        partitions = self.partitions()
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        if partition is not None:
+            if not 0 <= partition < partitions:
+                raise ValueError(f"Partition {partition} does not exist, the crawl has {partitions}")
+            self._take_over(partition, owner)
+            return self._frontier(partition, partitions)
+
+        for candidate in range(partitions):
+            if self.client is not None:
+                taken = not self.client.hsetnx(self._key('workers'), candidate, owner)
+            else:
+                with self.db:
+                    cursor = self.db.execute('INSERT OR IGNORE INTO workers VALUES (?, ?, 0)', (candidate, owner))
+                taken = not cursor.rowcount
+            if not taken:
+                return self._frontier(candidate, partitions)
+        raise ValueError(f"Every partition of {self.spec} already has a worker")
+
+    def _take_over(self, partition, owner):
+        # URLs the previous owner had in flight go back to the queue
+        if self.client is not None:
+            while self.client.lmove(self._key('active', partition), self._key('queue', partition), 'RIGHT', 'LEFT'):
+                pass
+            pipe = self.client.pipeline(transaction=True)
+            pipe.hset(self._key('workers'), partition, owner)
+            pipe.hdel(self._key('finished'), partition)
+            pipe.execute()
+            return
+        with self.db:
+            self.db.execute('UPDATE urls SET state = ? WHERE partition = ? AND state = ?', (QUEUED, partition, ACTIVE))
+            self.db.execute('INSERT OR REPLACE INTO workers VALUES (?, ?, 0)', (partition, owner))
+
+    def _frontier(self, partition, partitions):
+        if self.client is not None:
+            return RedisSharedFrontier(self.client, self.namespace, partition, partitions, self.limit())
+        return SqliteSharedFrontier(self.spec, partition, partitions, self.limit())
+
+    def finished(self):
+        # Drained, and every worker that joined has left
+        if self.client is not None:
+            pipe = self.client.pipeline(transaction=True)
+            for partition in range(self.partitions()):
+                pipe.llen(self._key('queue', partition))
+                pipe.llen(self._key('active', partition))
+            pipe.hlen(self._key('workers'))
+            pipe.hlen(self._key('finished'))
+            *lengths, joined, left = pipe.execute()
+            return not any(lengths) and joined == left
+        busy = self.db.execute('SELECT 1 FROM urls WHERE state IN (?, ?) LIMIT 1', (QUEUED, ACTIVE)).fetchone()
+        working = self.db.execute('SELECT 1 FROM workers WHERE finished = 0 LIMIT 1').fetchone()
+        return busy is None and working is None
+
+    def progress(self):
+        """Returns (done, failed, queued) URL counts."""
+        if self.client is not None:
+            queued = sum(self.client.llen(self._key(kind, partition))
+                         for partition in range(self.partitions()) for kind in ('queue', 'active'))
+            return self.client.scard(self._key('done')), self.client.scard(self._key('failed')), queued
+        counts = dict(self.db.execute('SELECT state, COUNT(*) FROM urls GROUP BY state').fetchall())
+        return counts.get(DONE, 0), counts.get(FAILED, 0), counts.get(QUEUED, 0) + counts.get(ACTIVE, 0)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        else:
+            self.db.close()
+
+
+def _is_redis(spec):
+    return spec.startswith(('redis://', 'rediss://', 'unix://'))
+
+
+def shared_store_available(spec):
+    return spec is None or not _is_redis(spec) or importlib.util.find_spec('redis') is not None
+
+
+def _connect(path):
+    db = sqlite3.connect(path, timeout=30)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS urls ('
+        'url TEXT PRIMARY KEY, depth INTEGER NOT NULL, partition INTEGER NOT NULL, state INTEGER NOT NULL)'
+    )
+    db.execute('CREATE INDEX IF NOT EXISTS urls_partition ON urls (partition, state)')
+    db.execute('CREATE INDEX IF NOT EXISTS urls_state ON urls (state)')
+    db.execute('CREATE TABLE IF NOT EXISTS workers (partition INTEGER PRIMARY KEY, owner TEXT, finished INTEGER)')
+    db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    db.commit()
+    return db
+
+
+def add_distributed_arguments(parser):
+    parser.add_argument('--shared-frontier', type=str, help='SQLite file or redis:// URL holding a frontier shared by several workers')
+    parser.add_argument('--distributed', type=int, default=0, help='Coordinate a crawl split over this many workers (hosts are partitioned between them)')
+    parser.add_argument('--local-workers', type=int, help='Workers the coordinator starts on this machine (default: all of them)')
+    parser.add_argument('--worker', action='store_true', help='Join the crawl in --shared-frontier as a worker')
+    parser.add_argument('--worker-id', type=int, help='Partition to work on, taken over if it has a worker already (default: the first free one)')
@@ -0,0 +1,120 @@
+import time
+
+from kreper.metrics import metrics
+from kreper.tables import parse_table
+
+
+class ExtractionPlan:
+    """
+    Collects every requested extractor so a page is walked once.
+
+    Args:
+    tags (list): HTML tag names to extract the text of.
+    images (bool): Extract <img> sources.
+    video (bool): Extract <video> sources.
+    audio (bool): Extract <audio> sources.
+    meta (bool): Extract <meta> name/content pairs.
+    table (bool): Extract <table> headers and rows.
+    """
+
+    def __init__(self, tags=None, images=False, video=False, audio=False, meta=False, table=False):
+        self.tags = [tag.lower() for tag in tags or []]
+        self.images = images
+        self.video = video
+        self.audio = audio
+        self.meta = meta
+        self.table = table
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            tags=args.extract,
+            images=args.extract_images,
+            video=args.extract_video,
+            audio=args.extract_audio,
+            meta=args.extract_meta,
+            table=args.extract_table,
+        )
+
+    def kinds(self):
+        # Extractors in the order their records are emitted
+        kinds = [('tag', tag) for tag in self.tags]
+        if self.images:
+            kinds.append(('image', 'img'))
+        if self.video:
+            kinds.append(('video', 'video'))
+        if self.audio:
+            kinds.append(('audio', 'audio'))
+        if self.meta:
+            kinds.append(('meta', 'meta'))
+        if self.table:
+            kinds.append(('table', 'table'))
+        return kinds
+
+    def tag_names(self):
+        return sorted({name for _, name in self.kinds()})
+
+    def __bool__(self):
+        return bool(self.kinds())
+
+    def run(self, soup):
+        """
+        Walks the tree once and returns (kind, record) pairs, grouped per
+        extractor in the same order the individual extract_* methods used.
+        """
+        kinds = self.kinds()
+        if not kinds or soup is None:
+            return []
+
+        buckets = {key: [] for key in kinds}
+        by_name = {}
+        for key in kinds:
+            by_name.setdefault(key[1], []).append(key)
+
+        if metrics.enabled:
+            self._walk_timed(soup, by_name, buckets)
+        else:
+            for element in soup.find_all(list(by_name)):
+                for key in by_name[element.name]:
+                    record = _extract(key, element)
+                    if record is not None:
+                        buckets[key].append(record)
+
+        results = []
+        for key in kinds:
+            for record in buckets[key]:
+                results.append((key[0], record))
+        # Position of each table on the page, kept with its rows in table datasets
+        for index, record in enumerate(buckets.get(('table', 'table'), [])):
+            record['table']['index'] = index
+        return results
+
+    def _walk_timed(self, soup, by_name, buckets):
+        # Same walk as run(), with the time spent in each extractor recorded
+        spent = {key: 0.0 for key in buckets}
+        start = time.perf_counter()
+        for element in soup.find_all(list(by_name)):
+            for key in by_name[element.name]:
+                began = time.perf_counter()
+                record = _extract(key, element)
+                spent[key] += time.perf_counter() - began
+                if record is not None:
+                    buckets[key].append(record)
+        metrics.observe('extract', time.perf_counter() - start)
+        for (kind, name), seconds in spent.items():
+            metrics.observe(f"extract.{name if kind == 'tag' else kind}", seconds)
+
+
+def _extract(key, element):
+    kind, name = key
+    if kind == 'tag':
+        return {name: element.text.strip()}
+    if kind in ('image', 'video', 'audio'):
+        src = element.get('src')
+        return {kind: src} if src else None
+    if kind == 'meta':
+        return {"meta": {element.get('name'): element.get('content')}}
+    if kind == 'table':
+        table = parse_table(element)
+        return {"table": table} if table else None
+    return None
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import time
+from collections import deque
+
+QUEUED, ACTIVE, DONE, FAILED = range(4)
+
+
+class MemoryFrontier:
+    """In-memory frontier and seen-set, the default for short crawls."""
+
+    def __init__(self):
+        self.seen = set()
+        self.queue = deque()
+        self.visited = []
+
+    def add(self, url, depth):
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.queue.append((url, depth))
+        return True
+
+    def pop(self):
+        return self.queue.popleft() if self.queue else None
+
+    def done(self, url, ok=True):
+        if ok:
+            self.visited.append(url)
+
+    def seen_count(self):
+        return len(self.seen)
+
+    def finished(self):
+        # Nothing outside this crawl adds URLs
+        return True
+
+    def visited_urls(self):
+        return list(self.visited)
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteFrontier:
+    """
+    Frontier and seen-set kept in a SQLite file, so a crawl of a very large
+    site uses bounded memory and can be resumed after a crash. Progress is
+    committed every `checkpoint_interval` seconds; URLs that were in flight
+    when a crawl died are queued again on resume. `before_commit`, when
+    set, runs before every commit, so the output of the pages being marked
+    done can be put on disk first.
+
+    Args:
+    path (str): SQLite database file.
+    resume (bool): Continue the crawl stored in `path` instead of starting over.
+    batch (int): URLs claimed from the database per query.
+    checkpoint_interval (float): Seconds between commits.
+    """
+
+    def __init__(self, path, resume=False, batch=256, checkpoint_interval=5.0):
+        self.path = path
+        self.batch = batch
+        self.checkpoint_interval = checkpoint_interval
+        if not resume and os.path.exists(path):
+            os.remove(path)
+
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS urls ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE NOT NULL, '
+            'depth INTEGER NOT NULL, state INTEGER NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS urls_state ON urls (state, id)')
+        # Pages that were being fetched when the last run stopped
+        self.db.execute('UPDATE urls SET state = ? WHERE state = ?', (QUEUED, ACTIVE))
+        self.db.commit()
+
+        self._count = self.db.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+        self._claimed = deque()
+        self._last_checkpoint = time.monotonic()
+        self.before_commit = None
+
+    def add(self, url, depth):
+        cursor = self.db.execute('INSERT OR IGNORE INTO urls (url, depth, state) VALUES (?, ?, ?)', (url, depth, QUEUED))
+        self._maybe_checkpoint()
+        if cursor.rowcount:
+            self._count += 1
+            return True
+        return False
+
+    def pop(self):
+        if not self._claimed:
+            rows = self.db.execute(
+                'SELECT id, url, depth FROM urls WHERE state = ? ORDER BY id LIMIT ?', (QUEUED, self.batch)
+            ).fetchall()
+            if not rows:
+                return None
+            self.db.executemany('UPDATE urls SET state = ? WHERE id = ?', [(ACTIVE, row[0]) for row in rows])
+            self._claimed.extend((url, depth) for _, url, depth in rows)
+        return self._claimed.popleft()
+
+    def done(self, url, ok=True):
+        self.db.execute('UPDATE urls SET state = ? WHERE url = ?', (DONE if ok else FAILED, url))
+        self._maybe_checkpoint()
+
+    def seen_count(self):
+        return self._count
+
+    def finished(self):
+        return True
+
+    def visited_urls(self):
+        return [row[0] for row in self.db.execute('SELECT url FROM urls WHERE state = ? ORDER BY id', (DONE,))]
+
+    def _maybe_checkpoint(self):
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.before_commit:
+            self.before_commit()
+        self.db.commit()
+        self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        # Claimed but unvisited URLs go back to the queue for the next run
+        self.db.executemany('UPDATE urls SET state = ? WHERE url = ?', [(QUEUED, url) for url, _ in self._claimed])
+        self._claimed.clear()
+        self.checkpoint()
+        self.db.close()
+
+
+def add_frontier_arguments(parser):
+    parser.add_argument('--state-file', type=str, help='SQLite file holding the crawl frontier, for large or resumable crawls')
+    parser.add_argument('--resume', action='store_true', help='Resume the crawl stored in --state-file')
+
+
+def frontier_from_args(args):
+    if args.state_file:
+        return SqliteFrontier(args.state_file, resume=args.resume)
+    return MemoryFrontier()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import requests
+
+from kreper.metrics import metrics
+
+INDEX_NAME = '.kreper-media.jsonl'
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaResult:
+    def __init__(self, url, status, path=None, error=None):
+        self.url = url
+        # One of: downloaded, exists, duplicate, blocked, failed
+        self.status = status
+        self.path = path
+        self.error = error
+
+
+class MediaIndex:
+    """
+    What a media directory holds: which URL went to which file and the
+    content hash of every file, kept across runs in a JSON-lines journal
+    next to the files. Each finished download is appended to it at once,
+    so an interrupted run loses nothing. There is one index per directory
+    in a process (see media_index), so downloaders of concurrent jobs
+    sharing a directory claim names and record files in the same place.
+
+    Args:
+    directory (str): The media directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_NAME)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.urls, self.hashes = self._load()
+        self.claimed = set(self.urls.values())
+        # url -> Event set once the download in flight for it ends
+        self._inflight = {}
+        if os.path.exists(self.path):
+            # Compacted, which also drops a line cut short by a crash
+            self.save()
+
+    def _load(self):
+        urls = {}
+        hashes = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'hash' in entry:
+                        hashes[entry['hash']] = entry['name']
+                    else:
+                        urls[entry['url']] = entry['name']
+        except OSError:
+            pass
+        return urls, hashes
+
+    def append(self, **entry):
+        # Called with the lock held
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def save(self):
+        # Called with the lock held, or before the index is shared
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for url, name in self.urls.items():
+                f.write(json.dumps({'url': url, 'name': name}, ensure_ascii=False) + '\n')
+            for digest, name in self.hashes.items():
+                f.write(json.dumps({'hash': digest, 'name': name}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def filename_for(self, url):
+        with self.lock:
+            if url in self.urls:
+                return self.urls[url]
+            name = _safe_name(url)
+            path = os.path.join(self.directory, name)
+            if name in self.claimed or os.path.exists(path):
+                # Another URL already uses this name, keep both files
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}-{hashlib.sha1(url.encode()).hexdigest()[:8]}{ext}"
+            self.claimed.add(name)
+            self.urls[url] = name
+            return name
+
+    def begin(self, url):
+        """
+        Marks the URL as being downloaded and returns True, or, if another
+        download of it is in flight, waits for that one and returns False.
+        """
+        with self.lock:
+            event = self._inflight.get(url)
+            if event is None:
+                self._inflight[url] = threading.Event()
+                return True
+        event.wait()
+        return False
+
+    def end(self, url):
+        with self.lock:
+            self._inflight.pop(url).set()
+
+
+# Directory (real path) -> its MediaIndex, shared by every downloader in the process
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def media_index(directory):
+    key = os.path.realpath(directory)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = MediaIndex(directory)
+        return _indexes[key]
+
+
+class MediaDownloader:
+    """
+    Downloads media files with a pool of workers. Bodies are streamed to
+    disk in chunks, partial files are resumed with HTTP Range requests, and
+    files whose content was already downloaded under another name are
+    dropped. The directory's MediaIndex remembers what was downloaded
+    across runs and keeps downloaders sharing the directory apart.
+
+    Args:
+    transport (Transport): Shared HTTP client.
+    output_dir (str): Directory the files are saved to.
+    workers (int): Number of concurrent downloads.
+    chunk_size (int): Bytes read and written per chunk.
+    scheduler (PolitenessScheduler): robots.txt rules and per-host rates
+        every download waits for, None to download right away.
+    """
+
+    def __init__(self, transport, output_dir, workers=8, chunk_size=CHUNK_SIZE, scheduler=None):
+        self.transport = transport
+        self.scheduler = scheduler
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.index = media_index(output_dir)
+
+    def download_all(self, urls, on_result=None):
+        # Keep the first occurrence of every URL, in page order
+        urls = list(dict.fromkeys(urls))
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for result in executor.map(self.download, urls):
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        with self.index.lock:
+            self.index.save()
+        return results
+
+    def filename_for(self, url):
+        return self.index.filename_for(url)
+
+    def download(self, url):
+        # One download of a URL at a time, so two never share a .part file;
+        # whoever waited then finds the file the first one left
+        while not self.index.begin(url):
+            pass
+        try:
+            return self._download(url)
+        finally:
+            self.index.end(url)
+
+    def _download(self, url):
+        index = self.index
+        name = index.filename_for(url)
+        path = os.path.join(self.output_dir, name)
+        if os.path.exists(path):
+            return MediaResult(url, 'exists', path)
+
+        if self.scheduler:
+            if not self.scheduler.allowed(url):
+                return MediaResult(url, 'blocked', path)
+            # Workers on the same host queue up for its slots instead of all firing at once
+            self.scheduler.wait(url)
+
+        part_path = f"{path}.part"
+        try:
+            digest = self._fetch(url, part_path)
+        except (requests.RequestException, OSError) as e:
+            return MediaResult(url, 'failed', path, e)
+
+        # The check, the rename and the hash are one step, so of two URLs with
+        # the same content only one file is kept
+        with index.lock:
+            original = index.hashes.get(digest)
+            if original and original != name and os.path.exists(os.path.join(self.output_dir, original)):
+                os.remove(part_path)
+                index.urls[url] = original
+                index.append(url=url, name=original)
+                return MediaResult(url, 'duplicate', os.path.join(self.output_dir, original))
+            try:
+                os.replace(part_path, path)
+            except FileNotFoundError as e:
+                # Another process downloading into the directory moved it first
+                if os.path.exists(path):
+                    return MediaResult(url, 'exists', path)
+                return MediaResult(url, 'failed', path, e)
+            index.hashes[digest] = name
+            index.append(url=url, name=name)
+            index.append(hash=digest, name=name)
+        return MediaResult(url, 'downloaded', path)
+
+    def _fetch(self, url, part_path):
+        hasher = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        # Byte ranges only line up with the file on disk for unencoded bodies
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+
+        with self.transport.get(url, stream=True, headers=headers) as response:
+            if offset and response.status_code == 416:
+                # The partial file already holds the whole body
+                return _hash_file(part_path, hasher, self.chunk_size)
+            if offset and response.status_code != 206:
+                # The server ignored the Range header, start over
+                offset = 0
+            response.raise_for_status()
+
+            if offset:
+                _hash_file(part_path, hasher, self.chunk_size)
+            with metrics.timer('download.media'), open(part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    metrics.incr('bytes', len(chunk))
+        return hasher.hexdigest()
+
+
+def _hash_file(path, hasher, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _safe_name(url):
+    name = unquote(os.path.basename(urlparse(url).path))
+    name = re.sub(r'[^\w.\-]+', '_', name).strip('._')
+    return name or 'media'
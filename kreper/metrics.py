@@ -0,0 +1,276 @@
+import cProfile
+import io
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+RESERVOIR_SIZE = 1024
+
+
+class _Timer:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Uniform sample of the observations, for percentiles
+        self.samples = []
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.samples[slot] = seconds
+
+    def percentile(self, percent):
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(round(percent / 100.0 * (len(samples) - 1))))]
+
+
+class Metrics:
+    """
+    Thread-safe counters and phase timers for the hot paths: connect, time
+    to first byte, body download, parse, each extractor and each output
+    writer, plus request/byte/status/retry/cache counters. Recording is a
+    no-op until enable() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.monotonic()
+        self.counters = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            self.started = time.monotonic()
+            _install_connection_hooks()
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, phase, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.get(phase)
+            if timer is None:
+                timer = self.timers[phase] = _Timer()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        with self._lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                if labels:
+                    counters.setdefault(name, {})[','.join(f"{k}={v}" for k, v in labels)] = value
+                else:
+                    counters[name] = value
+            phases = {
+                phase: {
+                    'count': timer.count,
+                    'total_s': round(timer.total, 6),
+                    'mean_ms': round(timer.total / timer.count * 1000, 3),
+                    'p50_ms': round(timer.percentile(50) * 1000, 3),
+                    'p99_ms': round(timer.percentile(99) * 1000, 3),
+                    'max_ms': round(timer.max * 1000, 3),
+                }
+                for phase, timer in sorted(self.timers.items())
+            }
+        return {'elapsed_s': round(time.monotonic() - self.started, 3), 'counters': counters, 'phases': phases}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE kreper_{name}_total counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"kreper_{name}_total{_labels(labels)} {value}")
+            if self.timers:
+                lines.append("# TYPE kreper_phase_seconds summary")
+            for phase, timer in sorted(self.timers.items()):
+                for quantile in (0.5, 0.99):
+                    labels = _labels((('phase', phase), ('quantile', quantile)))
+                    lines.append(f"kreper_phase_seconds{labels} {timer.percentile(quantile * 100):.6f}")
+                lines.append(f"kreper_phase_seconds_sum{_labels((('phase', phase),))} {timer.total:.6f}")
+                lines.append(f"kreper_phase_seconds_count{_labels((('phase', phase),))} {timer.count}")
+        return '\n'.join(lines) + '\n'
+
+    def format_summary(self):
+        snapshot = self.snapshot()
+        elapsed = snapshot['elapsed_s'] or 1e-9
+        requests = self.counter('requests')
+        lines = [
+            f"Run time: {snapshot['elapsed_s']:.2f}s, requests: {requests} ({requests / elapsed:.1f}/s), "
+            f"pages: {self.counter('pages')}, received: {self.counter('bytes') / (1024 * 1024):.2f} MB, "
+            f"retries: {self.counter('retries')}, cache hits: {self.counter('cache_hits')}",
+        ]
+        statuses = snapshot['counters'].get('responses')
+        if statuses:
+            lines.append("Status codes: " + ', '.join(f"{k.split('=')[1]}: {v}" for k, v in statuses.items()))
+        if snapshot['phases']:
+            lines.append(f"{'phase':<24}{'count':>9}{'total s':>11}{'mean ms':>11}{'p50 ms':>11}{'p99 ms':>11}")
+            for phase, stats in snapshot['phases'].items():
+                lines.append(f"{phase:<24}{stats['count']:>9}{stats['total_s']:>11.3f}{stats['mean_ms']:>11.3f}"
+                             f"{stats['p50_ms']:>11.3f}{stats['p99_ms']:>11.3f}")
+        return '\n'.join(lines)
+
+    def format_progress(self):
+        elapsed = time.monotonic() - self.started or 1e-9
+        requests = self.counter('requests')
+        return (f"{requests} requests ({requests / elapsed:.1f}/s), {self.counter('pages')} pages, "
+                f"{self.counter('bytes') / (1024 * 1024):.1f} MB, {self.counter('cache_hits')} cache hits")
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+# Process-wide registry used by every module
+metrics = Metrics()
+
+_hooks_installed = False
+
+
+def _install_connection_hooks():
+    # Times DNS + TCP connect (+ TLS for https) of every new pooled connection
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    from urllib3.connection import HTTPConnection
+
+    original_connect = HTTPConnection.connect
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return original_connect(self)
+        finally:
+            metrics.observe('connect', time.perf_counter() - start)
+            metrics.incr('connections')
+
+    HTTPConnection.connect = connect
+
+
+class _ThreadProfiler:
+    """
+    cProfile only sees the thread that enabled it. This gives every thread
+    started while profiling its own profiler and merges them at the end, so
+    the fetch and parse work done in worker threads shows up too.
+    """
+
+    def __init__(self):
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def _bootstrap(self, frame, event, arg):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+
+    def start(self):
+        # From 3.12 cProfile is built on sys.monitoring and already sees every thread
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._bootstrap)
+        self._bootstrap(None, None, None)
+
+    def stop(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self.profilers[0].disable()
+        with self._lock:
+            stats = pstats.Stats(self.profilers[0])
+            for profiler in self.profilers[1:]:
+                stats.add(profiler)
+        return stats
+
+
+def add_stats_arguments(parser):
+    parser.add_argument('--stats', action='store_true', help='Print a timing and traffic report at the end of the run')
+    parser.add_argument('--stats-interval', type=float, default=0, help='With --stats, also print progress every N seconds')
+    parser.add_argument('--stats-json', type=str, help='Write the metrics as JSON to this file at exit')
+    parser.add_argument('--stats-prom', type=str, help='Write the metrics in Prometheus text format to this file at exit')
+    parser.add_argument('--profile', type=str, help='Run under cProfile and write the profile to this file')
+
+
+@contextmanager
+def collect_stats(args, printer=print):
+    """
+    Enables the metrics and profiler requested on the command line for the
+    duration of the block, then prints and writes the reports.
+    """
+    if not (args.stats or args.stats_json or args.stats_prom or args.profile):
+        yield
+        return
+
+    metrics.enable()
+    stop = threading.Event()
+    if args.stats and args.stats_interval > 0:
+        def report():
+            while not stop.wait(args.stats_interval):
+                printer(f"Progress: {metrics.format_progress()}")
+        threading.Thread(target=report, daemon=True).start()
+
+    profiler = _ThreadProfiler() if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if profiler:
+            stats = profiler.stop()
+            stats.dump_stats(args.profile)
+        if args.stats:
+            printer(metrics.format_summary())
+            if profiler:
+                out = io.StringIO()
+                stats.stream = out
+                stats.sort_stats('cumulative').print_stats(15)
+                printer(out.getvalue())
+        if args.stats_json:
+            with open(args.stats_json, 'w') as f:
+                f.write(metrics.to_json())
+        if args.stats_prom:
+            with open(args.stats_prom, 'w') as f:
+                f.write(metrics.to_prometheus())
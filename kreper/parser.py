@@ -0,0 +1,164 @@
+import importlib.util
+from html.parser import HTMLParser
+
+from kreper.metrics import metrics
+from kreper.urls import absolute_link
+
+# Fastest first; html5lib is left out of auto selection, it is slower than html.parser
+PREFERRED_BACKENDS = ('lxml', 'html.parser')
+BACKENDS = ('auto', 'lxml', 'html5lib', 'html.parser')
+TEXT_CHUNK_SIZE = 64 * 1024
+
+# lxml.html once imported, False when lxml is not installed; see _lxml_html()
+_lxml = None
+
+
+def _lxml_html():
+    # Imported on first use, so runs that never read a page (--help, the
+    # daemon client) start without paying for it
+    global _lxml
+    if _lxml is None:
+        try:
+            import lxml.html
+            _lxml = lxml.html
+        except ImportError:
+            _lxml = False
+    return _lxml or None
+
+
+def backend_available(name):
+    if name in ('auto', 'html.parser'):
+        return True
+    return importlib.util.find_spec(name) is not None
+
+
+def select_backend(name=None):
+    """
+    Returns the BeautifulSoup tree builder to use. 'auto' (or None) picks
+    the fastest one that is installed.
+    """
+    if name and name != 'auto':
+        if not backend_available(name):
+            raise ValueError(f"Parser backend not available: {name}")
+        return name
+    for candidate in PREFERRED_BACKENDS:
+        if backend_available(candidate):
+            return candidate
+    return 'html.parser'
+
+
+def parse(markup, backend=None, only=None):
+    """
+    Parses a page. When `only` lists tag names, just those elements (and
+    everything inside them) are built into the tree.
+    """
+    # bs4 is slow to import and link, text and search passes never need it
+    from bs4 import BeautifulSoup, SoupStrainer
+    parse_only = SoupStrainer(list(only)) if only else None
+    with metrics.timer('parse'):
+        return BeautifulSoup(markup, select_backend(backend), parse_only=parse_only)
+
+
+def covers(parsed_only, wanted_only):
+    # Whether a tree built with parsed_only holds everything wanted_only needs
+    if parsed_only is None:
+        return True
+    if wanted_only is None:
+        return False
+    return set(wanted_only) <= set(parsed_only)
+
+
+def extract_links(markup, base_url, encoding=None):
+    """
+    Returns the absolute http(s) links of a page without building a soup.
+    Uses lxml when it is installed and the stdlib tokenizer otherwise.
+    """
+    with metrics.timer('parse_links'):
+        hrefs = _hrefs(markup, encoding)
+
+    links = []
+    for href in hrefs:
+        href = absolute_link(href, base_url)
+        if href:
+            links.append(href)
+    return links
+
+
+def _hrefs(markup, encoding):
+    html = _lxml_html()
+    if html is not None:
+        try:
+            document = html.document_fromstring(markup)
+            hrefs = document.xpath('//a/@href')
+        except (ValueError, html.etree.ParserError):
+            hrefs = []
+    else:
+        if isinstance(markup, bytes):
+            markup = markup.decode(encoding or 'utf-8', 'replace')
+        collector = _LinkCollector()
+        collector.feed(markup)
+        collector.close()
+        hrefs = collector.hrefs
+    return hrefs
+
+
+def text_nodes(markup, encoding=None):
+    """
+    Yields the text nodes of a page in document order, leaving out scripts,
+    styles and comments, without building a soup.
+    """
+    html = _lxml_html()
+    if html is not None:
+        try:
+            document = html.document_fromstring(markup)
+        except (ValueError, html.etree.ParserError):
+            return
+        yield from document.xpath('//text()[not(ancestor::script or ancestor::style)]')
+        return
+
+    if isinstance(markup, bytes):
+        markup = markup.decode(encoding or 'utf-8', 'replace')
+    collector = _TextCollector()
+    # Fed in slices so the text is handed on as it is tokenized
+    for start in range(0, len(markup), TEXT_CHUNK_SIZE):
+        collector.feed(markup[start:start + TEXT_CHUNK_SIZE])
+        yield from collector.flush()
+    collector.close()
+    yield from collector.flush()
+
+
+class _LinkCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href' and value is not None:
+                    self.hrefs.append(value)
+
+
+class _TextCollector(HTMLParser):
+    SKIPPED = ('script', 'style')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.texts.append(data)
+
+    def flush(self):
+        texts, self.texts = self.texts, []
+        return texts
@@ -0,0 +1,18 @@
+from kreper.crawler import page_links
+from kreper.parser import extract_links, parse
+
+
+def process_page(url, body, plan=None, backend=None, search=None):
+    """
+    Parses one fetched page, runs the extraction plan and the text search
+    over it. Returns the (kind, record) pairs and the links found on the
+    page. This is a plain module-level function so it can run in a worker
+    process.
+    """
+    # The search streams over the raw text nodes and needs no soup
+    matches = search.run(url, body) if search else []
+    if not plan:
+        return matches, extract_links(body, url)
+    # Links plus whatever the extractors need, nothing else is built
+    soup = parse(body, backend, plan.tag_names() + ['a'])
+    return plan.run(soup) + matches, page_links(soup, url)
@@ -0,0 +1,145 @@
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+
+class RobotsCache:
+    """
+    Fetches robots.txt once per host through the shared transport and
+    answers can-fetch and Crawl-delay questions from the cached copy.
+
+    Args:
+    transport (Transport): Shared HTTP client.
+    user_agent (str): Agent name matched against robots.txt groups.
+    """
+
+    def __init__(self, transport, user_agent=None):
+        self.transport = transport
+        self.user_agent = user_agent or transport.session.headers.get('User-Agent', '*')
+        self.parsers = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def _parser(self, url):
+        origin = _origin(url)
+        if origin in self.parsers:
+            return self.parsers[origin]
+
+        with self._lock:
+            host_lock = self._host_locks.setdefault(origin, threading.Lock())
+        # Only one thread fetches a given robots.txt, the others wait for it
+        with host_lock:
+            if origin not in self.parsers:
+                self.parsers[origin] = self._fetch(f"{origin}/robots.txt")
+        return self.parsers[origin]
+
+    def _fetch(self, robots_url):
+        parser = RobotFileParser(robots_url)
+        try:
+            response = self.transport.get(robots_url)
+        except requests.RequestException:
+            # Unreachable robots.txt: nothing is known to be disallowed
+            parser.allow_all = True
+            return parser
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def loaded(self, url):
+        return _origin(url) in self.parsers
+
+    def crawl_delay(self, url):
+        parser = self.parsers.get(_origin(url))
+        if parser is None:
+            return None
+        return parser.crawl_delay(self.user_agent)
+
+
+class PolitenessScheduler:
+    """
+    Per-host token buckets. Each host gets `rate` requests per second with
+    bursts of up to `burst`, slowed further by its robots.txt Crawl-delay.
+    Hosts are independent, so many hosts can be crawled at full speed while
+    each one only sees an acceptable request rate.
+
+    Args:
+    rate (float): Requests per second per host, None for no limit.
+    burst (int): Requests a host may receive back to back.
+    robots (RobotsCache): robots.txt rules to honor, None to ignore them.
+    """
+
+    def __init__(self, rate=None, burst=1, robots=None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.robots = robots
+        # host -> [tokens, last update]; tokens go negative for reserved slots
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def allowed(self, url):
+        return self.robots is None or self.robots.allowed(url)
+
+    def ready(self, url):
+        """
+        Whether the URL's host has its robots.txt loaded, so reserve() knows
+        its Crawl-delay. allowed() loads it.
+        """
+        return self.robots is None or self.robots.loaded(url)
+
+    def _interval(self, url):
+        interval = 1.0 / self.rate if self.rate else 0.0
+        delay = self.robots.crawl_delay(url) if self.robots else None
+        if delay:
+            return max(interval, float(delay)), 1
+        return interval, self.burst
+
+    def reserve(self, url):
+        """
+        Books the next request slot for the URL's host and returns how many
+        seconds to wait before sending it.
+        """
+        interval, burst = self._interval(url)
+        if not interval:
+            return 0.0
+
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self.buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - updated) / interval) - 1
+            self.buckets[host] = (tokens, now)
+        return max(0.0, -tokens * interval)
+
+    def wait(self, url):
+        # Blocking variant for code outside the crawler
+        delay = self.reserve(url)
+        if delay:
+            time.sleep(delay)
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def add_politeness_arguments(parser):
+    parser.add_argument('--rate', type=float, help='Maximum requests per second to each host')
+    parser.add_argument('--burst', type=int, default=1, help='Requests a host may receive back to back under --rate')
+
+
+def scheduler_from_args(args, transport):
+    if getattr(args, 'offline', False):
+        # Nothing goes over the network, so there is nobody to be polite to
+        return PolitenessScheduler()
+    robots = None if args.ignore_robots else RobotsCache(transport)
+    return PolitenessScheduler(rate=args.rate, burst=args.burst, robots=robots)
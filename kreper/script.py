@@ -0,0 +1,133 @@
+import copy
+import hashlib
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+
+from kreper.urls import canonicalize_url
+
+
+class ScriptJob:
+    """Everything a .krp script asks for one URL, as a parsed argument namespace."""
+
+    def __init__(self, url, args):
+        self.url = url
+        self.args = args
+
+
+class ScriptError(Exception):
+    pass
+
+
+def _tokens(line):
+    tokens = []
+    for token in shlex.split(line):
+        # Old-style tag lists: --extract [p,h1,h2]
+        if token.startswith('[') and token.endswith(']'):
+            tokens.extend(tag for tag in token.strip('[]').split(',') if tag)
+        else:
+            tokens.append(token)
+    return tokens
+
+
+# Options whose values add up when they are given on several lines
+CUMULATIVE = ('extract', 'search', 'search_regex')
+
+
+def _parse_line(parser, tokens, namespace, path, lineno):
+    previous = {name: list(getattr(namespace, name, None) or []) for name in CUMULATIVE}
+    try:
+        parser.parse_args(tokens, namespace=namespace)
+    except SystemExit:
+        # argparse has already printed what was wrong with the line
+        raise ScriptError(f"{path}:{lineno}: invalid command: {' '.join(tokens)}")
+    # --extract on several lines adds up instead of replacing
+    for name, values in previous.items():
+        current = getattr(namespace, name, None)
+        if current is not None and values:
+            setattr(namespace, name, list(dict.fromkeys(values + current)))
+
+
+def load_script(path, parser, defaults):
+    """
+    Parses a .krp file into one job per target URL. A '-u URL' line starts a
+    new target; every other line adds options to the current target, and
+    lines before the first '-u' apply to all targets. Options given on the
+    command line are the starting point for every target.
+
+    Args:
+    path (str): The .krp file.
+    parser (ArgumentParser): Parser the command lines are checked against.
+    defaults (Namespace): Parsed command-line arguments.
+    """
+    base = copy.deepcopy(defaults)
+    base.url = None
+    jobs = []
+    current = None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, start=1):
+            # Skip comments and empty lines
+            if line.startswith('//') or not line.strip():
+                continue
+            tokens = _tokens(line)
+            if tokens[0] in ('-u', '--url'):
+                current = copy.deepcopy(base)
+                jobs.append(current)
+            _parse_line(parser, tokens, current if current is not None else base, path, lineno)
+
+    return [ScriptJob(args.url, args) for args in jobs if args.url]
+
+
+def _merge_args(first, second, defaults):
+    merged = copy.deepcopy(first)
+    for name, value in vars(second).items():
+        current = getattr(merged, name, None)
+        if value == getattr(defaults, name, None):
+            # Not asked for by this job, keep what the earlier one wanted
+            continue
+        if isinstance(value, bool) and isinstance(current, bool):
+            setattr(merged, name, current or value)
+        elif isinstance(value, list) and isinstance(current, list):
+            setattr(merged, name, list(dict.fromkeys(current + value)))
+        elif value is not None:
+            setattr(merged, name, value)
+    return merged
+
+
+def merge_jobs(jobs, defaults):
+    """
+    Folds jobs for the same page into one, so every page is fetched and
+    parsed once however many times the script mentions it.
+    """
+    merged = {}
+    for job in jobs:
+        key = canonicalize_url(job.url)
+        if key in merged:
+            merged[key].args = _merge_args(merged[key].args, job.args, defaults)
+        else:
+            merged[key] = ScriptJob(job.url, copy.deepcopy(job.args))
+    jobs = list(merged.values())
+
+    # Crawls sharing a --state-file would trample each other's frontier
+    crawls = [job for job in jobs if job.args.crawl and getattr(job.args, 'state_file', None)]
+    if len(crawls) > 1:
+        for job in crawls:
+            suffix = hashlib.sha1(canonicalize_url(job.url).encode()).hexdigest()[:8]
+            job.args.state_file = f"{job.args.state_file}-{suffix}"
+    return jobs
+
+
+def run_jobs(jobs, run_job, workers=4):
+    """
+    Runs run_job(job) for every job, up to `workers` at a time. Returns
+    (job, exception) pairs for the jobs that failed.
+    """
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [(job, executor.submit(run_job, job)) for job in jobs]
+        for job, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failures.append((job, e))
+    return failures
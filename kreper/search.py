@@ -0,0 +1,253 @@
+import re
+
+from kreper.metrics import metrics
+from kreper.parser import text_nodes
+
+DEFAULT_CONTEXT = 40
+# Text nodes are scanned together in pieces of at least this many characters
+SCAN_CHUNK = 8192
+# Characters before a piece a regex match may start in
+REGEX_WINDOW = 1024
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class AhoCorasick:
+    """
+    Finds every occurrence of many literal terms in one pass over the text,
+    however many terms there are. Uses pyahocorasick when it is installed
+    and a pure Python automaton otherwise.
+    """
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for index, term in enumerate(self.terms):
+                self.automaton.add_word(term, index)
+            self.automaton.make_automaton()
+            return
+
+        self.automaton = None
+        # State 0 is the root; goto[state] maps a character to the next state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for index, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.out[state].append(index)
+
+        # Breadth-first, so a state's failure link is final before its children need it
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+    def finditer(self, text):
+        """Yields (start, term index) for every match, overlapping ones included."""
+        if self.automaton is not None:
+            if len(self.automaton):
+                for end, index in self.automaton.iter(text):
+                    yield end - len(self.terms[index]) + 1, index
+            return
+
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                yield position - len(self.terms[index]) + 1, index
+
+
+class TextSearch:
+    """
+    Searches page text for many literal terms and regular expressions at
+    once. Literals share a single Aho-Corasick automaton and regexes are
+    compiled once, so each page is scanned in one pass per regex plus one
+    for all the literals, streaming over its text nodes. The end of each
+    piece of text is carried over to the next one, so matches spanning
+    inline markup are found; a regex match can reach back REGEX_WINDOW
+    characters into the previous piece.
+
+    Args:
+    terms (list): Literal terms.
+    patterns (list): Regular expressions.
+    ignore_case (bool): Match regardless of case.
+    context (int): Characters of surrounding text kept on each side of a match.
+    """
+
+    def __init__(self, terms=None, patterns=None, ignore_case=True, context=DEFAULT_CONTEXT):
+        # Duplicates are dropped, the order of first appearance is kept
+        self.terms = list(dict.fromkeys(term for term in terms or [] if term))
+        self.patterns = list(dict.fromkeys(pattern for pattern in patterns or [] if pattern))
+        self.ignore_case = ignore_case
+        self.context = context
+        self._compile()
+
+    def _compile(self):
+        flags = re.IGNORECASE if self.ignore_case else 0
+        self.regexes = [re.compile(pattern, flags) for pattern in self.patterns]
+        self.matcher = AhoCorasick(term.lower() if self.ignore_case else term for term in self.terms)
+
+    # Only the options are pickled; worker processes rebuild the automaton
+    # once and reuse it, instead of receiving it with every page
+    def __getstate__(self):
+        return {'terms': self.terms, 'patterns': self.patterns, 'ignore_case': self.ignore_case,
+                'context': self.context}
+
+    def __setstate__(self, state):
+        key = (tuple(state['terms']), tuple(state['patterns']), state['ignore_case'])
+        compiled = _compiled.get(key)
+        self.__dict__.update(state)
+        if compiled is None:
+            self._compile()
+            _compiled[key] = (self.regexes, self.matcher)
+        else:
+            self.regexes, self.matcher = compiled
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Builds the search from --search, --search-regex and --search-file.
+        Returns None when nothing is searched for.
+        """
+        terms = list(args.search or [])
+        patterns = list(args.search_regex or [])
+        if args.search_file:
+            file_terms, file_patterns = load_terms(args.search_file)
+            terms.extend(file_terms)
+            patterns.extend(file_patterns)
+        if not terms and not patterns:
+            return None
+        return cls(terms, patterns, ignore_case=not args.case_sensitive, context=args.search_context)
+
+    def __bool__(self):
+        return bool(self.terms or self.patterns)
+
+    def run(self, url, markup, encoding=None):
+        """
+        Returns a ('match', record) pair for every match on the page. Each
+        record holds the URL, the term or regex, the offset of the match in
+        the page text and the text around it.
+        """
+        with metrics.timer('search'):
+            results = []
+            # Offsets count from the start of the page text, all text nodes
+            # joined; `base` is the offset of text[0]
+            text = ''
+            base = 0
+            # Matches ending at or before this offset have been reported
+            reported = 0
+            # Per regex, where its last reported match ended, so a rescan of
+            # the carried-over text does not report an overlapping match
+            regex_ends = {}
+            # Text kept from one piece for the next: the start of a match
+            # ending in the next piece, and the context before it
+            keep = self.context + max(max(map(len, self.terms), default=0), REGEX_WINDOW if self.patterns else 0)
+            pieces = []
+            size = 0
+            nodes = text_nodes(markup, encoding)
+            while True:
+                node = next(nodes, None)
+                if node is not None:
+                    pieces.append(node)
+                    size += len(node)
+                    if size < SCAN_CHUNK:
+                        continue
+                text += ''.join(pieces)
+                pieces = []
+                size = 0
+                # A match near the end may go on in the next piece, or lack its
+                # context; it is reported from there instead
+                cut = base + len(text) - (0 if node is None else self.context + 1)
+                for start, end, term, regex in self._matches(text):
+                    if not reported < base + end <= cut:
+                        continue
+                    if regex:
+                        if base + start < regex_ends.get(term, 0):
+                            continue
+                        regex_ends[term] = base + end
+                    results.append(('match', {
+                        'url': url,
+                        'term': term,
+                        'offset': base + start,
+                        'context': self._snippet(text, start, end),
+                    }))
+                if node is None:
+                    break
+                reported = max(reported, cut)
+                drop = max(0, cut - base - keep)
+                text = text[drop:]
+                base += drop
+        metrics.incr('matches', len(results))
+        return results
+
+    def _matches(self, text):
+        if self.terms:
+            # lower() keeps offsets in step with the original for all but a few exotic characters
+            haystack = text.lower() if self.ignore_case else text
+            for start, index in self.matcher.finditer(haystack):
+                term = self.terms[index]
+                yield start, start + len(term), term, False
+        for pattern, regex in zip(self.patterns, self.regexes):
+            for match in regex.finditer(text):
+                if match.end() > match.start():
+                    yield match.start(), match.end(), pattern, True
+
+    def _snippet(self, text, start, end):
+        snippet = text[max(0, start - self.context):end + self.context]
+        return ' '.join(snippet.split())
+
+
+# Automata rebuilt from pickled searches, keyed by their options
+_compiled = {}
+
+
+def load_terms(path):
+    """
+    Reads search terms from a file, one per line. Lines starting with 're:'
+    are regular expressions, blank lines and lines starting with '#' are
+    skipped.
+
+    Returns:
+    tuple: (terms, patterns)
+    """
+    terms = []
+    patterns = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if line.startswith('re:'):
+                patterns.append(line[3:])
+            else:
+                terms.append(line)
+    return terms, patterns
+
+
+def add_search_arguments(parser):
+    parser.add_argument('--search', type=str, nargs='+', help='Search the page text for these terms')
+    parser.add_argument('--search-regex', type=str, nargs='+', help='Search the page text for these regular expressions')
+    parser.add_argument('--search-file', type=str, help="File with one search term per line ('re:' prefix for regexes)")
+    parser.add_argument('--search-context', type=int, default=DEFAULT_CONTEXT, help='Characters of context kept around each match')
+    parser.add_argument('--case-sensitive', action='store_true', help='Match search terms case-sensitively')
@@ -0,0 +1,342 @@
+import csv
+import importlib.util
+import os
+import re
+import threading
+from datetime import date
+
+from kreper.metrics import metrics
+
+TABLE_FORMATS = ('parquet', 'arrow', 'csv')
+# Rows buffered per table layout before they are written out as one batch
+BATCH_ROWS = 10000
+# Spans beyond this are treated as broken markup rather than honored
+MAX_SPAN = 1000
+
+_INT_RE = re.compile(r'^[-+]?(\d{1,3}(,\d{3})+|\d+)$')
+_FLOAT_RE = re.compile(r'^[-+]?(\d{1,3}(,\d{3})+|\d+)?\.\d+([eE][-+]?\d+)?$|^[-+]?\d+[eE][-+]?\d+$')
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_BOOLS = {'true': True, 'false': False}
+
+
+
+def parse_table(element):
+    """
+    Turns a <table> element into a rectangular grid. Cells spanning several
+    columns or rows are repeated into every slot they cover. Header rows are
+    the <thead> rows, or the leading rows made only of <th> cells; several
+    header rows are joined per column. Column types are inferred from the
+    body cells and the values converted to match.
+
+    Returns:
+    dict: {'headers': [...], 'types': [...], 'rows': [[...], ...]}, or None
+        for a table without rows.
+    """
+    header_rows = []
+    body_rows = []
+    footer_rows = []
+    for tr, section in _own_rows(element):
+        cells = [cell for cell in tr.children if cell.name in ('th', 'td')]
+        if section == 'thead':
+            header_rows.append(cells)
+        elif section == 'tfoot':
+            footer_rows.append(cells)
+        elif not body_rows and cells and all(cell.name == 'th' for cell in cells):
+            header_rows.append(cells)
+        else:
+            body_rows.append(cells)
+
+    # Footer rows belong after the body whatever their place in the markup
+    header_grid = _grid(header_rows)
+    body_grid = _grid(body_rows + footer_rows)
+    width = max([len(row) for row in header_grid + body_grid] or [0])
+    if not width:
+        return None
+
+    headers = _headers(header_grid, width)
+    rows = [row + [''] * (width - len(row)) for row in body_grid]
+    types = [infer_type(row[i] for row in rows) for i in range(width)]
+    rows = [[convert(value, kind) for value, kind in zip(row, types)] for row in rows]
+    return {'headers': headers, 'types': types, 'rows': rows}
+
+
+def _own_rows(table):
+    # (row, section) for the rows of this table only, not of tables nested in
+    # its cells. Walking the children directly is much cheaper than find_all.
+    for child in table.children:
+        if child.name == 'tr':
+            yield child, None
+        elif child.name in ('thead', 'tbody', 'tfoot'):
+            for tr in child.children:
+                if tr.name == 'tr':
+                    yield tr, child.name
+
+
+def _span(cell, name):
+    value = cell.attrs.get(name)
+    if value is None:
+        return 1
+    try:
+        return min(max(int(value), 1), MAX_SPAN)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _grid(rows):
+    grid = []
+    # column -> [rows still covered, text] for cells spanning down
+    pending = {}
+    for cells in rows:
+        row = []
+        column = 0
+        cells = iter(cells)
+        while True:
+            if column in pending:
+                remaining, text = pending[column]
+                row.append(text)
+                if remaining == 1:
+                    del pending[column]
+                else:
+                    pending[column] = [remaining - 1, text]
+                column += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                if pending and column <= max(pending):
+                    # A gap left of a cell still spanning down from above
+                    row.append('')
+                    column += 1
+                    continue
+                break
+            text = ' '.join(' '.join(cell.strings).split())
+            rowspan = _span(cell, 'rowspan')
+            for _ in range(_span(cell, 'colspan')):
+                row.append(text)
+                if rowspan > 1:
+                    pending[column] = [rowspan - 1, text]
+                column += 1
+        grid.append(row)
+    return grid
+
+
+def _headers(header_grid, width):
+    headers = []
+    for i in range(width):
+        parts = []
+        for row in header_grid:
+            text = row[i] if i < len(row) else ''
+            # A cell spanning several header rows is only named once
+            if text and (not parts or parts[-1] != text):
+                parts.append(text)
+        headers.append(' / '.join(parts) or f"column_{i + 1}")
+
+    # Repeated names get a suffix so every column can be addressed
+    seen = {}
+    for i, header in enumerate(headers):
+        if header in seen:
+            seen[header] += 1
+            headers[i] = f"{header}_{seen[header]}"
+        else:
+            seen[header] = 1
+    return headers
+
+
+def infer_type(values):
+    """
+    Returns the narrowest of 'int', 'float', 'bool', 'date' and 'string'
+    that every non-empty value fits. Empty cells become nulls.
+    """
+    kind = None
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        if _INT_RE.match(value) and abs(int(value.replace(',', ''))) < 2 ** 63:
+            found = 'int'
+        elif _FLOAT_RE.match(value):
+            found = 'float'
+        elif value.lower() in _BOOLS:
+            found = 'bool'
+        elif _DATE_RE.match(value) and _is_date(value):
+            found = 'date'
+        else:
+            return 'string'
+        if kind is None or kind == found:
+            kind = found
+        elif {kind, found} == {'int', 'float'}:
+            kind = 'float'
+        else:
+            return 'string'
+    return kind or 'string'
+
+
+def _is_date(value):
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def convert(value, kind):
+    # Dates stay ISO strings here so records remain JSON-serializable
+    if kind == 'string':
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    if kind == 'int':
+        return int(value.replace(',', ''))
+    if kind == 'float':
+        return float(value.replace(',', ''))
+    if kind == 'bool':
+        return _BOOLS[value.lower()]
+    return value
+
+
+class TableSink:
+    """
+    Collects extracted tables into columnar datasets, one per table layout
+    (same headers and column types), and writes them in batches of
+    BATCH_ROWS rows as Parquet, Arrow IPC or CSV. Every row also records
+    the page it came from and the table's position on that page. Several
+    scrapers running in threads may share one sink.
+
+    Args:
+    directory (str): Where the dataset files go.
+    file_name (str): Base name of the files, suffixed with the layout number.
+    format (str): 'parquet', 'arrow' (both need pyarrow) or 'csv'.
+    batch_rows (int): Rows buffered per layout before they are written.
+    """
+
+    def __init__(self, directory, file_name, format='parquet', batch_rows=BATCH_ROWS):
+        if format not in TABLE_FORMATS:
+            raise ValueError(f"Unsupported table format: {format}")
+        if not table_format_available(format):
+            raise ValueError(f"{format} output needs the pyarrow package")
+        self.directory = directory
+        self.file_name = file_name
+        self.format = format
+        self.batch_rows = batch_rows
+        self.layouts = {}
+        self.tables = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, url, table):
+        with self._lock:
+            self._add(url, table)
+
+    def _add(self, url, table):
+        key = (tuple(table['headers']), tuple(table['types']))
+        layout = self.layouts.get(key)
+        if layout is None:
+            path = os.path.join(self.directory, f"{self.file_name}-{len(self.layouts) + 1}.{self.format}")
+            layout = self.layouts[key] = _Layout(path, self.format, table['headers'], table['types'])
+
+        columns = layout.columns
+        index = table.get('index', 0)
+        for row in table['rows']:
+            columns[0].append(url)
+            columns[1].append(index)
+            for column, value in zip(columns[2:], row):
+                column.append(value)
+        self.tables += 1
+        self.rows += len(table['rows'])
+        if len(columns[0]) >= self.batch_rows:
+            layout.flush()
+
+    def paths(self):
+        return [layout.path for layout in self.layouts.values()]
+
+    def close(self):
+        with self._lock:
+            for layout in self.layouts.values():
+                layout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Layout:
+    # One output file: the buffered columns plus the open file writer
+    def __init__(self, path, format, headers, types):
+        self.path = path
+        self.format = format
+        self.names = ['url', 'table'] + list(headers)
+        self.types = ['string', 'int'] + list(types)
+        self.columns = [[] for _ in self.names]
+        self.writer = None
+        self.file = None
+
+    def flush(self):
+        if not self.columns[0]:
+            return
+        with metrics.timer(f"write.{self.format}"):
+            if self.format == 'csv':
+                self._flush_csv()
+            else:
+                self._flush_arrow()
+        self.columns = [[] for _ in self.names]
+
+    def _flush_csv(self):
+        if self.writer is None:
+            self.file = open(self.path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.names)
+        self.writer.writerows(zip(*self.columns))
+
+    def _flush_arrow(self):
+        # pyarrow takes a while to import, so only runs writing Parquet or Arrow pay for it
+        import pyarrow
+        schema = pyarrow.schema([(name, _arrow_type(kind)) for name, kind in zip(self.names, self.types)])
+        arrays = [
+            pyarrow.array([date.fromisoformat(v) if v else None for v in column] if kind == 'date' else column,
+                          type=field.type)
+            for column, kind, field in zip(self.columns, self.types, schema)
+        ]
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+        if self.writer is None:
+            if self.format == 'parquet':
+                import pyarrow.parquet as parquet
+                self.writer = parquet.ParquetWriter(self.path, schema)
+            else:
+                import pyarrow.ipc as ipc
+                self.writer = ipc.new_file(self.path, schema)
+        if self.format == 'parquet':
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write(batch)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None and self.format != 'csv':
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+
+
+def _arrow_type(kind):
+    import pyarrow
+    return {
+        'int': pyarrow.int64(),
+        'float': pyarrow.float64(),
+        'bool': pyarrow.bool_(),
+        'date': pyarrow.date32(),
+    }.get(kind, pyarrow.string())
+
+
+def table_directory(output_dir, site_name):
+    return os.path.join(output_dir, site_name, '.extracted_data', 'tables')
+
+
+def add_table_arguments(parser):
+    parser.add_argument('--table-format', type=str, choices=TABLE_FORMATS, help='Write extracted tables as columnar datasets in this format')
+
+
+def table_format_available(format):
+    return format in (None, 'csv') or importlib.util.find_spec('pyarrow') is not None
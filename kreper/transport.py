@@ -0,0 +1,167 @@
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+from kreper.archive import ArchiveTransport, PageArchive, add_archive_arguments
+from kreper.cache import HTTPCache
+from kreper.metrics import metrics
+
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+
+
+class Transport:
+    """
+    Shared HTTP client for every fetch path. A single requests.Session keeps
+    one keep-alive connection pool per host, so connection and TLS setup is
+    paid once per host instead of once per request.
+
+    Args:
+    headers (dict): Default headers sent with every request.
+    connect_timeout (float): Seconds to wait for a connection.
+    read_timeout (float): Seconds to wait between bytes of the response.
+    retries (int): Retries for connection errors and 429/5xx responses.
+    backoff (float): Exponential backoff factor between retries.
+    pool_size (int): Keep-alive connections kept per host.
+    cache (HTTPCache): Optional on-disk cache used for conditional requests.
+    archive (PageArchive): Optional archive every fetched page is appended to.
+    """
+
+    def __init__(self, headers=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=0.5, pool_size=32, cache=None, archive=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.archive = archive
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Advertises br/zstd as well when urllib3 can decode them
+        self.session.headers.update(make_headers(accept_encoding=True))
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url, use_cache=True, **kwargs):
+        response = self._cached_get(url, use_cache, **kwargs)
+        # Streamed bodies (media) are not archived, they never pass through memory
+        if self.archive is not None and not kwargs.get('stream'):
+            self.archive.store(url, response)
+        return response
+
+    def _cached_get(self, url, use_cache=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # Streamed downloads bypass the cache, their bodies are written straight to disk
+        if self.cache is None or not use_cache or kwargs.get('stream'):
+            return self._get(url, **kwargs)
+
+        entry = self.cache.lookup(url)
+        if entry:
+            kwargs['headers'] = dict(self.cache.conditional_headers(entry), **(kwargs.get('headers') or {}))
+        response = self._get(url, **kwargs)
+
+        if response.status_code == 304 and entry:
+            body = self.cache.read_body(url)
+            if body is not None:
+                metrics.incr('cache_hits')
+                return _from_cache(response, entry, body)
+            # The body went missing underneath us, fetch it again unconditionally
+            kwargs['headers'] = {k: v for k, v in kwargs['headers'].items()
+                                 if k not in ('If-None-Match', 'If-Modified-Since')}
+            response = self._get(url, **kwargs)
+
+        if response.status_code == 200:
+            metrics.incr('cache_misses')
+            self.cache.store(url, response)
+        return response
+
+    def _get(self, url, **kwargs):
+        if not metrics.enabled:
+            return self.session.get(url, **kwargs)
+
+        start = time.perf_counter()
+        response = self.session.get(url, **kwargs)
+        total = time.perf_counter() - start
+        # elapsed runs from sending the request until the headers are parsed
+        ttfb = response.elapsed.total_seconds()
+        metrics.observe('ttfb', ttfb)
+        metrics.incr('requests')
+        metrics.incr('responses', status=response.status_code)
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            metrics.incr('retries', len(retries.history))
+        if not kwargs.get('stream'):
+            # Streamed bodies are timed and counted by whoever reads them
+            metrics.observe('download', max(0.0, total - ttfb))
+            metrics.incr('bytes', len(response.content))
+        return response
+
+    def close(self):
+        self.session.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _from_cache(response, entry, body):
+    # Turn the 304 into the 200 the caller would have seen without the cache
+    response.status_code = 200
+    response.reason = 'OK'
+    response._content = body
+    for name in ('content-type', 'etag', 'last-modified'):
+        if name in entry and name not in response.headers:
+            response.headers[name] = entry[name]
+    response.encoding = None
+    response.from_cache = True
+    return response
+
+
+def add_transport_arguments(parser):
+    parser.add_argument('--timeout', type=float, default=DEFAULT_READ_TIMEOUT, help='Read timeout in seconds')
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT, help='Connect timeout in seconds')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='Retries for failed requests')
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('KREPER_CACHE_DIR'), help='Directory for the on-disk HTTP cache')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the HTTP cache for this run')
+    parser.add_argument('--cache-max-age', type=float, help='Evict cache entries unused for this many days')
+    parser.add_argument('--cache-max-size', type=float, help='Evict least recently used cache entries above this many MB')
+    add_archive_arguments(parser)
+
+
+def cache_from_args(args):
+    if not args.cache_dir or args.no_cache:
+        return None
+    max_age = args.cache_max_age * 86400 if args.cache_max_age is not None else None
+    max_size = int(args.cache_max_size * 1024 * 1024) if args.cache_max_size is not None else None
+    return HTTPCache(args.cache_dir, max_age=max_age, max_size=max_size)
+
+
+def transport_from_args(args, headers=None, pool_size=32):
+    if args.offline:
+        return ArchiveTransport(PageArchive(args.archive, readonly=True), headers=headers)
+    return Transport(
+        headers=headers,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.timeout,
+        retries=args.retries,
+        pool_size=pool_size,
+        cache=cache_from_args(args),
+        archive=PageArchive(args.archive) if args.archive else None,
+    )
@@ -0,0 +1,89 @@
+import re
+from string import ascii_letters, digits
+from urllib.parse import urldefrag, urljoin, urlparse, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+UNRESERVED = frozenset(ascii_letters + digits + '-._~')
+
+
+def normalize_url(url):
+    """
+    Folds the spellings of a URL that address the same resource: scheme and
+    host case, default ports, an empty path and the fragment. Raises
+    ValueError for a URL that cannot be parsed, such as one with a port out
+    of range.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if ':' in host:
+        # hostname drops the brackets around an IPv6 address
+        host = f"[{host}]"
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        host = f"{userinfo}@{host}"
+    path = parts.path or '/'
+    return urlunsplit((scheme, host, path, parts.query, ''))
+
+
+def site_name(url):
+    # Host part of the URL, used to group output per site
+    return url.split("//")[-1].split("/")[0]
+
+
+def absolute_link(href, base_url):
+    """
+    Resolves an href against the page it was found on. Returns None for
+    anything that is not a well-formed http(s) link.
+    """
+    try:
+        href = urldefrag(urljoin(base_url, href.strip()))[0]
+        parts = urlparse(href)
+        # Parsing the port is what finds a malformed one
+        parts.port
+    except ValueError:
+        return None
+    if parts.scheme in ('http', 'https'):
+        return href
+    return None
+
+
+def canonicalize_url(url):
+    """
+    Reduces a URL to the one spelling the crawl frontier stores: on top of
+    normalize_url, dot segments are resolved, percent-escapes are folded and
+    query parameters are sorted by name. The crawler fetches this spelling,
+    so parameters are moved as they are, never decoded and encoded again.
+    """
+    parts = urlsplit(normalize_url(url))
+    path = _fold_escapes(_remove_dot_segments(parts.path))
+    # A stable sort keeps repeated parameters in their order
+    params = [_fold_escapes(param) for param in parts.query.split('&') if param]
+    query = '&'.join(sorted(params, key=lambda param: param.partition('=')[0]))
+    return urlunsplit((parts.scheme, parts.netloc, path, query, ''))
+
+
+def _fold_escapes(component):
+    # %7E and ~ are the same character; other escapes get upper-case hex
+    def fold(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in UNRESERVED else match.group(0).upper()
+    return re.sub(r'%([0-9A-Fa-f]{2})', fold, component)
+
+
+def _remove_dot_segments(path):
+    segments = path.split('/')
+    output = []
+    for segment in segments:
+        if segment == '.':
+            continue
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/'.join(output) or '/'
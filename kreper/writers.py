@@ -0,0 +1,263 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+
+from kreper.metrics import metrics
+
+FORMATS = ('json', 'jsonl', 'csv', 'xlsx')
+
+
+def output_path(format, site_name, file_name, output_dir):
+    # Create directory for extracted data
+    directory = os.path.join(output_dir, site_name, '.extracted_data')
+    os.makedirs(directory, exist_ok=True)
+
+    # Generate hash for unique filename
+    hash_filename = hashlib.md5(file_name.encode()).hexdigest()
+    return os.path.join(directory, f"{hash_filename}.{format}")
+
+
+def open_writer(format, path, append=False):
+    """
+    Returns a streaming writer for the given output format. Records are
+    written as they arrive, so memory use does not grow with the run.
+    With `append`, jsonl and csv output continue an existing file (used by
+    resumed crawls); json and xlsx files are always rewritten.
+    """
+    writers = {
+        'json': JsonWriter,
+        'jsonl': JsonLinesWriter,
+        'csv': CsvWriter,
+        'xlsx': XlsxWriter,
+    }
+    if format not in writers:
+        raise ValueError(f"Unsupported output format: {format}")
+    if append and format in ('jsonl', 'csv'):
+        return writers[format](path, append=True)
+    return writers[format](path)
+
+
+def _flatten(value):
+    # Nested records (meta, tables) go into a single cell as JSON
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class RecordWriter:
+    format = None
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def write(self, record):
+        if metrics.enabled:
+            start = time.perf_counter()
+            self._write(record)
+            metrics.observe(f"write.{self.format}", time.perf_counter() - start)
+        else:
+            self._write(record)
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def flush(self):
+        """Puts the records written so far on disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonWriter(RecordWriter):
+    """Writes a JSON array one record at a time."""
+
+    format = 'json'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write('[')
+
+    def _write(self, record):
+        self.file.write(',\n' if self.count else '\n')
+        self.file.write(json.dumps(record, ensure_ascii=False))
+
+    def close(self):
+        self.file.write('\n]\n' if self.count else ']\n')
+        self.file.close()
+
+
+class JsonLinesWriter(RecordWriter):
+    """Writes one JSON record per line."""
+
+    format = 'jsonl'
+
+    def __init__(self, path, append=False):
+        super().__init__(path)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter(RecordWriter):
+    """Writes CSV rows as they arrive; the header comes from the first record."""
+
+    format = 'csv'
+
+    def __init__(self, path, append=False):
+        super().__init__(path)
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        # An appended file already has its header
+        self.has_header = append and self.file.tell() > 0
+
+    def _write(self, record):
+        if not self.count and not self.has_header:
+            self.writer.writerow(record.keys())
+        self.writer.writerow([_flatten(value) for value in record.values()])
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWriter(RecordWriter):
+    """
+    Writes an Excel sheet with openpyxl's write-only mode. Rows are flushed
+    to disk as they are appended and every cell reuses the same few style
+    objects, so the workbook is never held in memory.
+    """
+
+    format = 'xlsx'
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+        super().__init__(path)
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Extracted Data")
+
+        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+        self.header_style = (Font(bold=True, size=12), Alignment(horizontal='center', vertical='center'), None, border)
+        cell_font = Font(size=12)
+        cell_alignment = Alignment(horizontal='left', vertical='center')
+        # Highlight alternate rows
+        self.row_styles = (
+            (cell_font, cell_alignment, PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid'), border),
+            (cell_font, cell_alignment, PatternFill(start_color='DDDDDD', end_color='DDDDDD', fill_type='solid'), border),
+        )
+
+    def _cell(self, value, style):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        if isinstance(value, str):
+            value = ILLEGAL_CHARACTERS_RE.sub('', value)
+        cell = WriteOnlyCell(self.sheet, value=value)
+        cell.font, cell.alignment, fill, cell.border = style
+        if fill is not None:
+            cell.fill = fill
+        return cell
+
+    def _write(self, record):
+        from openpyxl.utils import get_column_letter
+
+        if not self.count:
+            # Column widths have to be set before the first row is written
+            for i in range(len(record)):
+                self.sheet.column_dimensions[get_column_letter(i + 1)].width = 20
+            self.sheet.append([self._cell(header, self.header_style) for header in record.keys()])
+        # Data starts on row 2, even rows are white
+        style = self.row_styles[self.count % 2]
+        self.sheet.append([self._cell(_flatten(value), style) for value in record.values()])
+
+    def flush(self):
+        # A workbook is only complete once saved, there is nothing to flush before that
+        pass
+
+    def close(self):
+        with metrics.timer('write.xlsx.save'):
+            self.workbook.save(self.path)
+
+
+class SynchronizedWriter:
+    """Lets several scrapers running in threads share one output file."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.path = writer.path
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self.writer.count
+
+    def write(self, record):
+        with self._lock:
+            self.writer.write(record)
+
+    def write_all(self, records):
+        with self._lock:
+            self.writer.write_all(records)
+
+    def flush(self):
+        with self._lock:
+            self.writer.flush()
+
+    def close(self):
+        with self._lock:
+            self.writer.close()
+
+
+class WriterPool:
+    """
+    Hands out one SynchronizedWriter per output path, so jobs running at the
+    same time that save to the same file share it instead of truncating it
+    under each other. The file is closed when the last job releases it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # path -> [writer, jobs using it]
+        self._writers = {}
+
+    def acquire(self, format, path, append=False):
+        with self._lock:
+            entry = self._writers.get(path)
+            if entry is None:
+                entry = self._writers[path] = [SynchronizedWriter(open_writer(format, path, append=append)), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, writer):
+        """Closes the writer if no other job uses it; returns whether it did."""
+        with self._lock:
+            entry = self._writers[writer.path]
+            entry[1] -= 1
+            if entry[1]:
+                return False
+            del self._writers[writer.path]
+        writer.close()
+        return True
@@ -1,403 +1,835 @@
-#############################
-# By: M. Hamza Sufyan (v-1) #
-#############################
-
-import requests
-from bs4 import BeautifulSoup
-from rich import print
-from rich.console import Console
-import argparse
-import os
-import re
-import json
-import csv
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-
-console = Console()
-
-class Kreper:
-    def __init__(self, url, user_agent=None, ignore_robots=False):
-        self.url = url
-        self.visited = set()
-        self.data = []
-        self.headers = {'User-Agent': user_agent} if user_agent else {}
-        self.ignore_robots = ignore_robots
-
-    def simple_scrape(self):
-        try:
-            response = requests.get(self.url, headers=self.headers)
-            response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
-        except requests.RequestException as e:
-            console.print(f"[bold red]Error:[/bold red] {e}")
-            return None
-
-    def crawl(self, depth, limit):
-        if depth < 0 or len(self.visited) >= limit or self.url in self.visited:
-            return
-        self.visited.add(self.url)
-        console.print(f"[bold green]Crawling:[/bold green] {self.url}")
-
-        soup = self.simple_scrape()
-        if soup:
-            for link in soup.find_all('a', href=True):
-                next_url = link['href']
-                if next_url.startswith('/'):
-                    next_url = f"{self.url}{next_url}"
-                if next_url not in self.visited:
-                    self.crawl(depth - 1, limit)
-
-    def extract_tags(self, tags):
-        soup = self.simple_scrape()
-        if soup:
-            for tag in tags:
-                elements = soup.find_all(tag)
-                for element in elements:
-                    console.print(f"[bold blue]{tag}:[/bold blue] {element.text.strip()}")
-                    self.data.append({tag: element.text.strip()})
-
-    def extract_images(self):
-        soup = self.simple_scrape()
-        if soup:
-            images = soup.find_all('img')
-            for img in images:
-                img_src = img.get('src')
-                if img_src:
-                    console.print(f"[bold yellow]Image URL:[/bold yellow] {img_src}")
-                    self.data.append({"image": img_src})
-
-    def extract_video(self):
-        soup = self.simple_scrape()
-        if soup:
-            videos = soup.find_all('video')
-            for video in videos:
-                video_src = video.get('src')
-                if video_src:
-                    console.print(f"[bold magenta]Video URL:[/bold magenta] {video_src}")
-                    self.data.append({"video": video_src})
-
-    def extract_audio(self):
-        soup = self.simple_scrape()
-        if soup:
-            audios = soup.find_all('audio')
-            for audio in audios:
-                audio_src = audio.get('src')
-                if audio_src:
-                    console.print(f"[bold cyan]Audio URL:[/bold cyan] {audio_src}")
-                    self.data.append({"audio": audio_src})
-
-    def extract_meta(self):
-        soup = self.simple_scrape()
-        if soup:
-            meta_tags = soup.find_all('meta')
-            for meta in meta_tags:
-                content = meta.get('content')
-                name = meta.get('name')
-                console.print(f"[bold green]Meta Tag:[/bold green] {name} - {content}")
-                self.data.append({"meta": {name: content}})
-
-    def extract_table(self):
-        soup = self.simple_scrape()
-        if soup:
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                if rows:
-                    # Extract table headers
-                    headers = [th.text.strip() for th in rows[0].find_all('th')]
-                    # Create a rich table with headers
-                    rich_table = Table(title="Extracted Table")
-                    for header in headers:
-                        rich_table.add_column(header, justify="center")
-
-                    # Extract table rows
-                    for row in rows[1:]:
-                        columns = [td.text.strip() for td in row.find_all('td')]
-                        rich_table.add_row(*columns)
-                    
-                    console.print(rich_table)
-                    self.data.append({"table": rich_table})
-
-    def store_html(self):
-        soup = self.simple_scrape()
-        if soup:
-            with open('page.html', 'w', encoding='utf-8') as f:
-                f.write(str(soup))
-            console.print("[bold yellow]HTML saved to:[/bold yellow] page.html")
-
-    def search_text(self, search_term):
-        soup = self.simple_scrape()
-        if soup:
-            if re.search(search_term, soup.text, re.IGNORECASE):
-                console.print(f"[bold green]Found text:[/bold green] {search_term}")
-            else:
-                console.print(f"[bold red]Text not found:[/bold red] {search_term}")
-
-    
-    
-
-    def output_excel(self, site_name: str, file_name: str, output_dir: str) -> None:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.utils import get_column_letter
-        import os
-        import hashlib
-
-        """
-        Outputs extracted data to an Excel file.
-
-        Args:
-        site_name (str): Name of the website.
-        file_name (str): Name of the file.
-        output_dir (str): Output directory.
-        """
-
-        # Create directory for extracted data
-        directory = os.path.join(output_dir, site_name, '.extracted_data')
-        os.makedirs(directory, exist_ok=True)
-
-        # Generate hash for unique filename
-        hash_object = hashlib.md5(file_name.encode())
-        hash_filename = hash_object.hexdigest()
-
-        # Create Excel file path
-        file_path = os.path.join(directory, f"{hash_filename}.xlsx")
-
-        # Initialize workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Extracted Data"
-
-        # Set header row font and alignment
-        header_font = Font(bold=True, size=12)
-        header_alignment = Alignment(horizontal='center', vertical='center')
-
-        # Write header
-        if self.data:
-            headers = list(self.data[0].keys())
-            for i, header in enumerate(headers):
-                cell = ws.cell(row=1, column=i+1)
-                cell.value = header
-                cell.font = header_font
-                cell.alignment = header_alignment
-
-                # Set column width
-                column_letter = get_column_letter(i+1)
-                ws.column_dimensions[column_letter].width = 20
-            
-        # Write data
-        for i, item in enumerate(self.data, start=2):
-            for j, value in enumerate(item.values()):
-                cell = ws.cell(row=i, column=j+1)
-                cell.value = value
-                
-                # Set cell font and alignment
-                cell.font = Font(size=12)
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-                
-                # Highlight alternate rows
-                if i % 2 == 0:
-                    cell.fill = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
-                else:
-                    cell.fill = PatternFill(start_color='DDDDDD', end_color='DDDDDD', fill_type='solid')
-        
-        # Set border
-        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        for row in ws.rows:
-            for cell in row:
-                cell.border = border
-        
-        wb.save(file_path)
-        console.print(f"[bold yellow]Data saved to:[/bold yellow] {file_path}")
-
-    def download_images(self, output_dir):
-        soup = self.simple_scrape()
-        if soup:
-            images = soup.find_all('img')
-            for img in images:
-                img_src = img.get('src')
-                if img_src:
-                    console.print(f"[bold yellow]Downloading image:[/bold yellow] {img_src}")
-                    response = requests.get(img_src)
-                    if response.status_code == 200:
-                        filename = img_src.split('/')[-1]
-                        with open(os.path.join(output_dir, filename), 'wb') as f:
-                            f.write(response.content)
-                    else:
-                        console.print(f"[bold red]Failed to download image:[/bold red] {img_src}")
-
-    def download_videos(self, output_dir):
-        soup = self.simple_scrape()
-        if soup:
-            videos = soup.find_all('video')
-            for video in videos:
-                video_src = video.get('src')
-                if video_src:
-                    console.print(f"[bold magenta]Downloading video:[/bold magenta] {video_src}")
-                    response = requests.get(video_src)
-                    if response.status_code == 200:
-                        filename = video_src.split('/')[-1]
-                        with open(os.path.join(output_dir, filename), 'wb') as f:
-                            f.write(response.content)
-                    else:
-                        console.print(f"[bold red]Failed to download video:[/bold red] {video_src}")
-
-    def output_data(self, format: str, site_name: str, file_name: str, output_dir: str) -> None:
-        import hashlib
-        
-        """
-        Outputs extracted data to a file in the specified format.
-
-        Args:
-        format (str): Output format (json, csv, xlsx).
-        site_name (str): Name of the website.
-        file_name (str): Name of the file.
-        output_dir (str): Output directory.
-        """
-
-        # Create directory for extracted data
-        directory = os.path.join(output_dir, site_name, '.extracted_data')
-        os.makedirs(directory, exist_ok=True)
-
-        # Generate hash for unique filename
-        hash_object = hashlib.md5(file_name.encode())
-        hash_filename = hash_object.hexdigest()
-
-        try:
-            if format == 'json':
-                # Output data to JSON file
-                file_path = os.path.join(directory, f"{hash_filename}.json")
-                with open(file_path, 'w') as f:
-                    json.dump(self.data, f, indent=4)
-                console.print(f"[bold yellow]Data saved to:[/bold yellow] {file_path}")
-
-            elif format == 'xlsx':
-                # Output data to Excel file
-                self.output_excel(site_name, file_name, output_dir)
-
-            elif format == 'csv':
-                # Output data to CSV file
-                file_path = os.path.join(directory, f"{hash_filename}.csv")
-                with open(file_path, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    # Write header
-                    if self.data:
-                        writer.writerow(self.data[0].keys())
-                    for item in self.data:
-                        writer.writerow(item.values())
-                console.print(f"[bold yellow]Data saved to:[/bold yellow] {file_path}")
-
-        except Exception as e:
-            console.print(f"[bold red]Error saving data:[/bold red] {e}")
-
-
-def main():
-    parser = argparse.ArgumentParser(description="Web Scraper - Kreper")
-    parser.add_argument('-u', '--url', help='Target URL to scrape')
-    parser.add_argument('--crawl', action='store_true', help='Crawl the website')
-    parser.add_argument('--depth', type=int, default=0, help='Depth for crawling')
-    parser.add_argument('--limit', type=int, default=100, help='Limit number of pages to crawl')
-    parser.add_argument('--extract', nargs='+', help='Extract specific HTML tags')
-    parser.add_argument('--extract-images', action='store_true', help='Extract image URLs')
-    parser.add_argument('--extract-video', action='store_true', help='Extract video URLs')
-    parser.add_argument('--extract-audio', action='store_true', help='Extract audio URLs')
-    parser.add_argument('--extract-meta', action='store_true', help='Extract meta tags')
-    parser.add_argument('--extract-table', action='store_true', help='Extract tables from the page')
-    parser.add_argument('--download-images', action='store_true', help='Download found images')
-    parser.add_argument('--download-videos', action='store_true', help='Download found videos')
-    parser.add_argument('--media-dir', type=str, default='./media', help='Directory for saving downloaded media')
-    parser.add_argument('--store-html', action='store_true', help='Store complete HTML of the page')
-    parser.add_argument('--search', type=str, help='Search for specific text in the page content')
-    parser.add_argument('--output', type=str, choices=['json', 'csv', 'xlsx'], help='Output format for extracted data')
-    parser.add_argument('--S', action='store_true', help='Save extracted data to specified directory')
-    parser.add_argument('--file-name', type=str, default='output', help='Filename for saved output')
-    parser.add_argument('--user-agent', type=str, help='Custom user-agent string')
-    parser.add_argument('--ignore-robots', action='store_true', help='Ignore robots.txt rules')
-    parser.add_argument('--output-dir', type=str, default='./', help='Directory for saving extracted data')
-    parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
-    parser.add_argument('--mc', type=str, help='Load commands from a script file')
-
-    args = parser.parse_args()
-
-    # Create instance of Kreper, URL will be set later if using --mc
-    scraper = Kreper(url=args.url, user_agent=args.user_agent, ignore_robots=args.ignore_robots)
-
-    if args.mc:
-        try:
-            with open(args.mc, 'r') as f:
-                for line in f:
-                    # Skip comments and empty lines
-                    if line.startswith('//') or not line.strip():
-                        continue
-                    
-                    # Execute command
-                    command = line.strip()
-                    command_parts = command.split()
-
-                    # Handle -u argument to set URL from script
-                    if command_parts[0] == '-u':
-                        scraper.url = command_parts[1]
-                    elif '--crawl' in command_parts:
-                        scraper.crawl(args.depth, args.limit)
-                    elif '--extract' in command_parts:
-                        tags = command_parts[command_parts.index('--extract') + 1].strip('[]').split(',')
-                        scraper.extract_tags(tags)
-                    elif '--extract-images' in command_parts:
-                        scraper.extract_images()
-                    elif '--extract-video' in command_parts:
-                        scraper.extract_video()
-                    elif '--extract-audio' in command_parts:
-                        scraper.extract_audio()
-                    elif '--extract-table' in command_parts:
-                        scraper.extract_table()
-                    elif '--extract-meta' in command_parts:
-                        scraper.extract_meta()
-                    elif '--store-html' in command_parts:
-                        scraper.store_html()
-                    elif '--search' in command_parts:
-                        search_term = command_parts[command_parts.index('--search') + 1]
-                        scraper.search_text(search_term)
-                    elif '--output' in command_parts:
-                        output_format = command_parts[command_parts.index('--output') + 1]
-                        scraper.output_data(output_format, scraper.url.split("//")[-1].split("/")[0], args.file_name, args.output_dir)
-
-        except Exception as e:
-            console.print(f"[bold red]Error loading commands from file:[/bold red] {e}")
-            return
-
-    # If URL was provided in command line, use it
-    if args.url:
-        scraper.url = args.url
-
-    # Run commands if specified in command line
-    if args.crawl:
-        scraper.crawl(args.depth, args.limit)
-
-    if args.extract:
-        scraper.extract_tags(args.extract)
-
-    if args.extract_images:
-        scraper.extract_images()
-
-    if args.extract_video:
-        scraper.extract_video()
-
-    if args.extract_audio:
-        scraper.extract_audio()
-
-    if args.extract_meta:
-        scraper.extract_meta()
-
-    if args.store_html:
-        scraper.store_html()
-
-    if args.search:
-        scraper.search_text(args.search)
-
-    if args.output:
-        scraper.output_data(args.output, scraper.url.split("//")[-1].split("/")[0], args.file_name, args.output_dir)
-
-if __name__ == '__main__':
-    main()
+#############################
+# By: M. Hamza Sufyan (v-1) #
+#############################
+
+import requests
+from rich import print
+from rich.console import Console
+from rich.markup import escape
+import argparse
+import hashlib
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from functools import partial
+from urllib.parse import urljoin, urlsplit
+from kreper.daemon import JobError, add_daemon_arguments
+from kreper.dedup import add_dedup_arguments, detector_from_args
+from kreper.distributed import SharedFrontier, SharedStore, add_distributed_arguments, shared_store_available
+from kreper.extract import ExtractionPlan
+from kreper.frontier import MemoryFrontier, SqliteFrontier, add_frontier_arguments, frontier_from_args
+from kreper.metrics import add_stats_arguments, collect_stats
+from kreper.parser import BACKENDS, backend_available, covers, parse, select_backend
+from kreper.politeness import PolitenessScheduler, RobotsCache, add_politeness_arguments, scheduler_from_args
+from kreper.script import ScriptError, ScriptJob, load_script, merge_jobs, run_jobs
+from kreper.search import TextSearch, add_search_arguments
+from kreper.tables import TableSink, add_table_arguments, table_directory, table_format_available
+from kreper.transport import Transport, add_transport_arguments, transport_from_args
+from kreper.urls import canonicalize_url, site_name
+from kreper.writers import FORMATS, WriterPool, open_writer, output_path
+
+console = Console()
+
+class Kreper:
+    def __init__(self, url, user_agent=None, ignore_robots=False, transport=None, parser=None, scheduler=None,
+                 stop=None):
+        self.url = url
+        self.visited = set()
+        self.data = []
+        self.headers = {'User-Agent': user_agent} if user_agent else {}
+        self.ignore_robots = ignore_robots
+        # Pooled keep-alive client shared by every fetch path
+        self.transport = transport or Transport(headers=self.headers)
+        # robots.txt rules and per-host rate limits
+        self.scheduler = scheduler or PolitenessScheduler(robots=None if ignore_robots else RobotsCache(self.transport))
+        # Fastest installed BeautifulSoup backend unless one is requested
+        self.parser = select_backend(parser)
+        # Raw bodies and parsed documents shared by every extractor, keyed by URL
+        self.pages = {}
+        self.documents = {}
+        # Streaming output writer, see open_output()
+        self.writer = None
+        # Columnar table datasets, see open_tables()
+        self.tables = None
+        # Set to end a crawl early (daemon jobs are cancelled this way)
+        self.stop = stop
+        # Process pool kept warm by the daemon for --parse-workers
+        self.parse_pool = None
+
+    def simple_scrape(self, url=None, refresh=False, only=None, scheduled=False):
+        """
+        Returns the parsed page, fetching it at most once per URL. With
+        `only`, just those tags are built into the tree; a later call that
+        needs more re-parses the cached body without fetching it again.
+        """
+        url = url or self.url
+        body = self.page_body(url, refresh, scheduled)
+        if body is None:
+            return None
+
+        cached = self.documents.get(url)
+        if cached and covers(cached[1], only):
+            return cached[0]
+        soup = parse(body, self.parser, only)
+        self.documents[url] = (soup, only)
+        return soup
+
+    def page_body(self, url=None, refresh=False, scheduled=False):
+        """Returns the raw page, fetching it at most once per URL."""
+        url = url or self.url
+        if refresh or url not in self.pages:
+            # Failures are cached too, so a dead URL is only reported once
+            self.pages[url] = self.fetch_page(url, scheduled)
+            self.documents.pop(url, None)
+        return self.pages[url]
+
+    def fetch_page(self, url, scheduled=False):
+        if not scheduled:
+            if not self.scheduler.allowed(url):
+                console.print(f"[bold red]Blocked by robots.txt:[/bold red] {url}")
+                return None
+            self.scheduler.wait(url)
+        try:
+            response = self.transport.get(url)
+            response.raise_for_status()
+            return response.content
+        except requests.RequestException as e:
+            console.print(f"[bold red]Error:[/bold red] {e}")
+            return None
+
+    def crawl(self, depth, limit, workers=8, plan=None, parse_workers=0, frontier=None, search=None, dedup=None,
+              seeds=None):
+        """
+        Crawls from self.url, running the extraction plan and the text
+        search on every page.
+        With parse_workers > 0, parsing and extraction move to a process
+        pool so they scale with cores instead of sharing the GIL with the
+        fetching threads. Pass a SqliteFrontier to keep the frontier on disk
+        (or a SharedFrontier to crawl one partition of a distributed crawl),
+        and a DuplicateDetector to skip pages whose content was already seen.
+        `seeds` replaces self.url as the starting points.
+        """
+        # Only crawls need the asyncio machinery, one-page runs skip importing it
+        from kreper.crawler import Crawler, page_links
+        from kreper.pipeline import process_page
+
+        seed = canonicalize_url(self.url) if self.url else None
+        # Links plus whatever the extractors need, nothing else is built
+        only = plan.tag_names() + ['a'] if plan else ['a']
+
+        def visit(url, level):
+            if url == seed and not parse_workers:
+                # The seed goes through the document cache so later steps can reuse it
+                soup = self.simple_scrape(only=only, scheduled=True)
+                if soup is None:
+                    return None
+                if dedup:
+                    dedup.check(url, self.pages[self.url])
+                records = plan.run(soup) if plan else []
+                if search:
+                    records += search.run(url, self.pages[self.url])
+                return records, page_links(soup, url)
+
+            # Crawled pages are processed once and dropped so memory stays bounded;
+            # the crawler has already applied robots.txt and the rate limits
+            body = self.fetch_page(url, scheduled=True)
+            if body is not None and dedup:
+                duplicate = dedup.check(url, body)
+                if duplicate:
+                    return duplicate
+            if body is None or parse_workers:
+                return body
+            return process_page(url, body, plan, self.parser, search)
+
+        def on_page(url, level, records):
+            console.print(f"[bold green]Crawling:[/bold green] {url} (Depth: {level})")
+            for kind, record in records:
+                self.emit(kind, record, url)
+
+        def on_duplicate(url, level, duplicate):
+            if duplicate.exact:
+                console.print(f"[bold yellow]Duplicate:[/bold yellow] {url} (same as {duplicate.original})")
+            else:
+                console.print(f"[bold yellow]Near-duplicate:[/bold yellow] {url} "
+                              f"(of {duplicate.original}, {duplicate.distance} bits apart)")
+
+        frontier = frontier or MemoryFrontier()
+        if isinstance(frontier, (SqliteFrontier, SharedFrontier)):
+            # Records are on disk before their pages are committed as done
+            frontier.before_commit = self.flush_output
+        crawler = Crawler(visit, depth=depth, limit=limit, workers=workers, on_page=on_page,
+                          process=partial(process_page, plan=plan, backend=self.parser, search=search),
+                          process_workers=parse_workers,
+                          frontier=frontier, scheduler=self.scheduler, on_duplicate=on_duplicate,
+                          process_pool=self.parse_pool, stop=self.stop)
+        crawler.run(seeds or [self.url])
+        if crawler.blocked:
+            console.print(f"[bold yellow]Skipped (robots.txt):[/bold yellow] {crawler.blocked} pages")
+        if crawler.duplicates:
+            console.print(f"[bold yellow]Skipped (duplicate content):[/bold yellow] {crawler.duplicates} pages")
+        if isinstance(frontier, MemoryFrontier):
+            # Disk-backed frontiers keep the visited set on disk instead
+            self.visited.update(frontier.visited_urls())
+
+    def extract(self, plan):
+        soup = self.simple_scrape(only=plan.tag_names())
+        for kind, record in plan.run(soup):
+            self.emit(kind, record)
+
+    def emit(self, kind, record, url=None):
+        if kind == 'table' and self.tables:
+            # Table rows go to the columnar dataset instead of the record output
+            table = record['table']
+            self.tables.add(url or self.url, table)
+            console.print(f"[bold green]Table:[/bold green] {len(table['rows'])} rows x {len(table['headers'])} "
+                          f"columns from {url or self.url}")
+            return
+        self.report(kind, record)
+        if self.writer:
+            self.writer.write(record)
+        else:
+            self.data.append(record)
+
+    def report(self, kind, record):
+        if kind == 'tag':
+            for tag, text in record.items():
+                console.print(f"[bold blue]{tag}:[/bold blue] {text}")
+        elif kind == 'image':
+            console.print(f"[bold yellow]Image URL:[/bold yellow] {record['image']}")
+        elif kind == 'video':
+            console.print(f"[bold magenta]Video URL:[/bold magenta] {record['video']}")
+        elif kind == 'audio':
+            console.print(f"[bold cyan]Audio URL:[/bold cyan] {record['audio']}")
+        elif kind == 'meta':
+            for name, content in record['meta'].items():
+                console.print(f"[bold green]Meta Tag:[/bold green] {name} - {content}")
+        elif kind == 'match':
+            console.print(f"[bold green]Found {escape(record['term'])}:[/bold green] {record['url']} "
+                          f"(offset {record['offset']}) {escape(record['context'])}")
+        elif kind == 'table':
+            from rich.table import Table
+            rich_table = Table(title="Extracted Table")
+            for header in record['table']['headers']:
+                rich_table.add_column(header, justify="center")
+            for row in record['table']['rows']:
+                rich_table.add_row(*('' if value is None else str(value) for value in row))
+            console.print(rich_table)
+
+    def extract_tags(self, tags):
+        self.extract(ExtractionPlan(tags=tags))
+
+    def extract_images(self):
+        self.extract(ExtractionPlan(images=True))
+
+    def extract_video(self):
+        self.extract(ExtractionPlan(video=True))
+
+    def extract_audio(self):
+        self.extract(ExtractionPlan(audio=True))
+
+    def extract_meta(self):
+        self.extract(ExtractionPlan(meta=True))
+
+    def extract_table(self):
+        self.extract(ExtractionPlan(table=True))
+
+    def store_html(self, output_dir='./'):
+        """
+        Saves the page exactly as it was served, one file per URL under
+        <output_dir>/<site>/html, so storing another page never overwrites it.
+        """
+        body = self.page_body()
+        if body is None:
+            return
+        directory = os.path.join(output_dir, site_name(self.url), 'html')
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', urlsplit(self.url).path.rstrip('/').rsplit('/', 1)[-1]) or 'index'
+        name = os.path.splitext(name)[0]
+        path = os.path.join(directory, f"{name}-{hashlib.sha1(self.url.encode()).hexdigest()[:10]}.html")
+        with open(path, 'wb') as f:
+            f.write(body)
+        console.print(f"[bold yellow]HTML saved to:[/bold yellow] {path}")
+
+    def search_text(self, search):
+        """
+        Searches the page for a TextSearch, or a single term, and emits a
+        record for every match.
+        """
+        if isinstance(search, str):
+            search = TextSearch([search])
+        body = self.page_body()
+        if body is None:
+            return
+        found = set()
+        for kind, record in search.run(self.url, body):
+            found.add(record['term'])
+            self.emit(kind, record)
+        for term in search.terms + search.patterns:
+            if term not in found:
+                console.print(f"[bold red]Text not found:[/bold red] {escape(term)}")
+
+    def output_excel(self, site_name: str, file_name: str, output_dir: str) -> None:
+        """
+        Outputs extracted data to an Excel file.
+
+        Args:
+        site_name (str): Name of the website.
+        file_name (str): Name of the file.
+        output_dir (str): Output directory.
+        """
+        self.output_data('xlsx', site_name, file_name, output_dir)
+
+    def download_images(self, output_dir, workers=8):
+        soup = self.simple_scrape()
+        if soup:
+            urls = [urljoin(self.url, img['src']) for img in soup.find_all('img', src=True)]
+            self.download_media(urls, output_dir, workers, "image", "yellow")
+
+    def download_videos(self, output_dir, workers=8):
+        soup = self.simple_scrape()
+        if soup:
+            urls = []
+            for video in soup.find_all('video'):
+                # A video either has its own src or one <source> per format
+                sources = [video] + video.find_all('source')
+                urls.extend(urljoin(self.url, source['src']) for source in sources if source.get('src'))
+            self.download_media(urls, output_dir, workers, "video", "magenta")
+
+    def download_media(self, urls, output_dir, workers, label, color):
+        def on_result(result):
+            if result.status == 'downloaded':
+                console.print(f"[bold {color}]Downloaded {label}:[/bold {color}] {result.url} -> {result.path}")
+            elif result.status == 'exists':
+                console.print(f"[bold {color}]Already downloaded {label}:[/bold {color}] {result.path}")
+            elif result.status == 'duplicate':
+                console.print(f"[bold {color}]Duplicate {label}:[/bold {color}] {result.url} (same as {result.path})")
+            elif result.status == 'blocked':
+                console.print(f"[bold red]Blocked by robots.txt:[/bold red] {result.url}")
+            else:
+                console.print(f"[bold red]Failed to download {label}:[/bold red] {result.url} ({result.error})")
+
+        from kreper.media import MediaDownloader
+        downloader = MediaDownloader(self.transport, output_dir, workers=workers, scheduler=self.scheduler)
+        downloader.download_all(urls, on_result=on_result)
+
+    def output_data(self, format: str, site_name: str, file_name: str, output_dir: str) -> None:
+        """
+        Outputs extracted data to a file in the specified format.
+
+        Args:
+        format (str): Output format (json, jsonl, csv, xlsx).
+        site_name (str): Name of the website.
+        file_name (str): Name of the file.
+        output_dir (str): Output directory.
+        """
+        try:
+            file_path = output_path(format, site_name, file_name, output_dir)
+            with open_writer(format, file_path) as writer:
+                writer.write_all(self.data)
+            console.print(f"[bold yellow]Data saved to:[/bold yellow] {file_path}")
+
+        except Exception as e:
+            console.print(f"[bold red]Error saving data:[/bold red] {e}")
+
+    def open_output(self, format: str, site_name: str, file_name: str, output_dir: str, append: bool = False) -> None:
+        """
+        Streams every record extracted from now on straight to a file instead
+        of keeping it in self.data, so memory stays flat on large runs.
+        Records collected before the call are written first.
+        """
+        file_path = output_path(format, site_name, file_name, output_dir)
+        self.writer = open_writer(format, file_path, append=append)
+        self.writer.write_all(self.data)
+        self.data = []
+
+    def open_tables(self, format: str, site_name: str, file_name: str, output_dir: str) -> None:
+        """
+        Sends extracted tables to columnar datasets (Parquet, Arrow or CSV),
+        one file per table layout, instead of the record output.
+        """
+        self.tables = TableSink(table_directory(output_dir, site_name), file_name, format)
+
+    def close_tables(self) -> None:
+        if self.tables:
+            self.tables.close()
+            for path in self.tables.paths():
+                console.print(f"[bold yellow]Tables saved to:[/bold yellow] {path}")
+            console.print(f"[bold yellow]Tables:[/bold yellow] {self.tables.tables} tables, {self.tables.rows} rows")
+            self.tables = None
+
+    def flush_output(self) -> None:
+        if self.writer:
+            self.writer.flush()
+
+    def close_output(self) -> None:
+        if self.writer:
+            self.writer.close()
+            console.print(f"[bold yellow]Data saved to:[/bold yellow] {self.writer.path} ({self.writer.count} records)")
+            self.writer = None
+
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(description="Web Scraper - Kreper")
+    parser.add_argument('-u', '--url', help='Target URL to scrape')
+    parser.add_argument('--crawl', action='store_true', help='Crawl the website')
+    parser.add_argument('--depth', type=int, default=0, help='Depth for crawling')
+    parser.add_argument('--limit', type=int, default=100, help='Limit number of pages to crawl')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent crawl workers')
+    add_frontier_arguments(parser)
+    add_distributed_arguments(parser)
+    add_dedup_arguments(parser)
+    parser.add_argument('--parse-workers', type=int, default=0, help='Processes for parsing and extraction while crawling (0 = parse in the fetch threads)')
+    parser.add_argument('--extract', nargs='+', help='Extract specific HTML tags')
+    parser.add_argument('--extract-images', action='store_true', help='Extract image URLs')
+    parser.add_argument('--extract-video', action='store_true', help='Extract video URLs')
+    parser.add_argument('--extract-audio', action='store_true', help='Extract audio URLs')
+    parser.add_argument('--extract-meta', action='store_true', help='Extract meta tags')
+    parser.add_argument('--extract-table', action='store_true', help='Extract tables from the page')
+    add_table_arguments(parser)
+    parser.add_argument('--download-images', action='store_true', help='Download found images')
+    parser.add_argument('--download-videos', action='store_true', help='Download found videos')
+    parser.add_argument('--media-dir', type=str, default='./media', help='Directory for saving downloaded media')
+    parser.add_argument('--media-workers', type=int, default=8, help='Number of concurrent media downloads')
+    parser.add_argument('--store-html', action='store_true', help='Store complete HTML of the page')
+    add_search_arguments(parser)
+    parser.add_argument('--output', type=str, choices=FORMATS, help='Output format for extracted data')
+    parser.add_argument('--S', action='store_true', help='Save extracted data to specified directory')
+    parser.add_argument('--file-name', type=str, default='output', help='Filename for saved output')
+    parser.add_argument('--user-agent', type=str, help='Custom user-agent string')
+    parser.add_argument('--ignore-robots', action='store_true', help='Ignore robots.txt rules')
+    add_politeness_arguments(parser)
+    parser.add_argument('--parser', type=str, choices=BACKENDS, default='auto', help='HTML parser backend (auto picks the fastest installed)')
+    add_transport_arguments(parser)
+    parser.add_argument('--output-dir', type=str, default='./', help='Directory for saving extracted data')
+    parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
+    parser.add_argument('--mc', type=str, help='Load commands from a script file')
+    parser.add_argument('--script-workers', type=int, default=4, help='Number of script targets processed at the same time')
+    add_stats_arguments(parser)
+    add_daemon_arguments(parser)
+    return parser
+
+
+def check_args(parser, args):
+    try:
+        TextSearch.from_args(args)
+    except (OSError, re.error) as e:
+        parser.error(f"invalid search: {e}")
+    if not backend_available(args.parser):
+        parser.error(f"parser backend is not installed: {args.parser}")
+    if args.resume and not (args.state_file or args.shared_frontier):
+        parser.error("--resume needs --state-file or --shared-frontier")
+    if args.resume and args.output in ('json', 'xlsx') and not args.distributed:
+        # A distributed crawl rebuilds its output from the workers' jsonl parts
+        parser.error("--resume continues the output file, use --output jsonl or csv")
+    if (args.distributed or args.worker) and not (args.shared_frontier and args.url and args.crawl):
+        parser.error("--distributed and --worker need --shared-frontier, -u and --crawl")
+    if not shared_store_available(args.shared_frontier):
+        parser.error("a redis:// --shared-frontier needs the redis package")
+    if args.offline and not args.archive:
+        parser.error("--offline needs --archive")
+    if args.offline and not args.url and (args.download_images or args.download_videos or args.store_html):
+        # Without -u the extractors run over every archived page, these work on one page
+        parser.error("--download-images, --download-videos and --store-html need -u with --offline")
+    if not table_format_available(args.table_format):
+        parser.error(f"--table-format {args.table_format} needs the pyarrow package")
+    if args.serve and (args.url or args.mc or args.distributed or args.worker):
+        parser.error("--serve takes its jobs from the daemon API, not from -u, --mc or --distributed")
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    check_args(parser, args)
+
+    store = frontier = None
+    if args.worker:
+        # Joined before anything is opened, so the worker's own archive and
+        # stats files can be named after its partition
+        store = SharedStore(args.shared_frontier)
+        try:
+            frontier = store.join(args.worker_id)
+        except ValueError as e:
+            console.print(f"[bold red]Error joining crawl:[/bold red] {e}")
+            store.close()
+            return
+        args = worker_args(args, frontier.partition)
+
+    headers = {'User-Agent': args.user_agent} if args.user_agent else None
+    transport = transport_from_args(args, headers=headers, pool_size=max(args.workers, args.script_workers, 10))
+    # One transport and one scheduler for every target, so connections and
+    # robots.txt rules are shared and per-host rates hold across targets
+    scheduler = scheduler_from_args(args, transport)
+
+    def make_scraper(url, stop=None):
+        return Kreper(url=url, user_agent=args.user_agent, ignore_robots=args.ignore_robots, transport=transport,
+                      parser=args.parser, scheduler=scheduler, stop=stop)
+
+    # console.out skips markup, the profile listing is full of brackets
+    with collect_stats(args, printer=console.out), transport:
+        if args.serve:
+            run_daemon(args, make_scraper)
+        elif args.mc:
+            run_script(args, parser, make_scraper)
+        elif args.worker:
+            run_worker(args, make_scraper, store, frontier)
+        elif args.distributed:
+            run_coordinator(args, transport.archive)
+        else:
+            run_job(make_scraper(args.url), args)
+
+
+def run_job(scraper, args, writer=None, tables=None, frontier=None):
+    """
+    Runs every command in args against scraper.url. The page is fetched and
+    parsed once, however many commands use it. `frontier` replaces the one
+    --state-file would give a crawl.
+    """
+    site = site_name(scraper.url) if scraper.url else 'archive'
+    if tables:
+        scraper.tables = tables
+    elif args.table_format and args.extract_table:
+        scraper.open_tables(args.table_format, site, args.file_name, args.output_dir)
+    if writer:
+        scraper.writer = writer
+    elif args.output and (scraper.url or args.offline):
+        # Records are streamed to the output file as they are extracted
+        scraper.open_output(args.output, site, args.file_name, args.output_dir, append=args.resume)
+
+    try:
+        # Every requested extractor runs in a single pass over the page
+        plan = ExtractionPlan.from_args(args)
+
+        search = TextSearch.from_args(args)
+
+        if not args.crawl and (args.download_images or args.download_videos):
+            # Media downloads need the whole tree, so build it once up front
+            # instead of a partial tree for the extractors followed by a full
+            # one (--store-html only needs the raw body)
+            scraper.simple_scrape()
+
+        if args.offline and not scraper.url:
+            # No target: the extractors run over every page in the archive
+            archive = scraper.transport.archive
+            urls = archive.urls()
+            scraper.crawl(0, len(urls), args.workers, plan=plan, parse_workers=args.parse_workers,
+                          frontier=frontier_from_args(args), search=search, dedup=detector_from_args(args),
+                          seeds=urls)
+            return
+        if args.crawl:
+            # Extractors are applied to every crawled page, seed included
+            scraper.crawl(args.depth, args.limit, args.workers, plan=plan, parse_workers=args.parse_workers,
+                          frontier=frontier or frontier_from_args(args), search=search, dedup=detector_from_args(args))
+        elif plan:
+            scraper.extract(plan)
+
+        if args.download_images:
+            scraper.download_images(args.media_dir, args.media_workers)
+
+        if args.download_videos:
+            scraper.download_videos(args.media_dir, args.media_workers)
+
+        if args.store_html:
+            scraper.store_html(args.output_dir)
+
+        if search and not args.crawl:
+            scraper.search_text(search)
+    finally:
+        if writer:
+            # Shared writers are closed by whoever opened them
+            scraper.writer = None
+        else:
+            scraper.close_output()
+        if tables:
+            scraper.tables = None
+        else:
+            scraper.close_tables()
+
+
+def run_script(args, parser, make_scraper, writers=None):
+    """
+    Runs a .krp script: all commands for a URL become one job, the same URL
+    mentioned twice is fetched once, and up to --script-workers URLs are
+    processed at the same time. `writers` is the WriterPool of a daemon, whose
+    other jobs may be saving to the same files.
+    """
+    try:
+        jobs = load_script(args.mc, parser, args)
+    except (OSError, ScriptError) as e:
+        console.print(f"[bold red]Error loading commands from file:[/bold red] {e}")
+        return
+    if args.url:
+        # Commands given on the command line run against -u as well
+        jobs.append(ScriptJob(args.url, args))
+    jobs = merge_jobs(jobs, args)
+
+    # Targets saving to the same file share one writer instead of overwriting each other
+    writers = writers or WriterPool()
+    job_writers = {}
+    for job in jobs:
+        if job.args.output:
+            path = output_path(job.args.output, site_name(job.url), job.args.file_name, job.args.output_dir)
+            job_writers[id(job)] = writers.acquire(job.args.output, path, append=job.args.resume)
+    # Same for table datasets
+    sinks = {}
+    job_sinks = {}
+    for job in jobs:
+        if job.args.table_format and job.args.extract_table:
+            directory = table_directory(job.args.output_dir, site_name(job.url))
+            key = (directory, job.args.file_name, job.args.table_format)
+            if key not in sinks:
+                sinks[key] = TableSink(directory, job.args.file_name, job.args.table_format)
+            job_sinks[id(job)] = sinks[key]
+
+    console.print(f"[bold green]Running script:[/bold green] {args.mc} ({len(jobs)} targets)")
+    try:
+        failures = run_jobs(jobs, lambda job: run_job(make_scraper(job.url), job.args, job_writers.get(id(job)),
+                                                      job_sinks.get(id(job))),
+                            workers=args.script_workers)
+    finally:
+        for writer in job_writers.values():
+            if writers.release(writer):
+                console.print(f"[bold yellow]Data saved to:[/bold yellow] {writer.path} ({writer.count} records)")
+        for sink in sinks.values():
+            sink.close()
+            for path in sink.paths():
+                console.print(f"[bold yellow]Tables saved to:[/bold yellow] {path}")
+
+    for job, error in failures:
+        console.print(f"[bold red]Error running commands for:[/bold red] {job.url} ({error})")
+
+
+
+class JobArgumentParser(argparse.ArgumentParser):
+    # A daemon job with a bad command line is refused, the daemon itself keeps
+    # running and nothing is printed on its console: -h answers with the help
+    def error(self, message):
+        raise JobError(message)
+
+    def print_help(self, file=None):
+        raise JobError(self.format_help())
+
+    def exit(self, status=0, message=None):
+        raise JobError(message or f"exited with status {status}")
+
+
+# Options of a daemon job that would need their own transport, scheduler or
+# metrics; jobs get the daemon's instead
+DAEMON_ONLY = ('serve', 'daemon_workers', 'distributed', 'local_workers', 'worker', 'worker_id',
+               'stats', 'stats_interval', 'stats_json', 'stats_prom', 'profile')
+
+
+def run_daemon(args, make_scraper):
+    """
+    Serves jobs on --serve until interrupted. A job is a skraper.py command
+    line; every job shares the daemon's transport, politeness scheduler and
+    parse processes, so connections, robots.txt rules and warm parsers carry
+    over from one job to the next. Connection, cache, archive and politeness
+    options are the daemon's own: a job inherits them and may not change them.
+    """
+    from kreper.daemon import KreperDaemon
+    from kreper.metrics import metrics
+
+    # Shared settings are every option the transport and the scheduler are built from
+    shared_options = argparse.ArgumentParser(add_help=False)
+    add_transport_arguments(shared_options)
+    add_politeness_arguments(shared_options)
+    shared = [action.dest for action in shared_options._actions] + ['user_agent', 'ignore_robots', 'parser']
+    parse_pool = None
+    if args.parse_workers:
+        from concurrent.futures import ProcessPoolExecutor
+        parse_pool = ProcessPoolExecutor(max_workers=args.parse_workers)
+
+    def parse(argv):
+        parser = build_parser(JobArgumentParser)
+        # Options not given in the job keep the daemon's values
+        job_args = parser.parse_args(argv, namespace=argparse.Namespace(**{name: getattr(args, name) for name in shared}))
+        check_args(parser, job_args)
+        defaults = vars(build_parser().parse_args([]))
+        for name in DAEMON_ONLY:
+            if getattr(job_args, name) != defaults[name]:
+                raise JobError(f"--{name.replace('_', '-')} is not available in daemon jobs")
+        for name in shared:
+            if getattr(job_args, name) != getattr(args, name):
+                raise JobError(f"--{name.replace('_', '-')} is set when the daemon starts")
+        if not (job_args.url or job_args.mc or job_args.offline):
+            raise JobError("a job needs -u, --mc or --offline")
+        return job_args
+
+    # Jobs running at the same time that save to the same file share its writer
+    writers = WriterPool()
+
+    def run(job_args, stop):
+        if job_args.mc:
+            run_script(job_args, build_parser(JobArgumentParser), lambda url: make_scraper(url, stop), writers)
+            return {}
+        scraper = make_scraper(job_args.url, stop)
+        scraper.parse_pool = parse_pool
+        if not job_args.output:
+            run_job(scraper, job_args)
+            return {'records': scraper.data}
+        site = site_name(scraper.url) if scraper.url else 'archive'
+        writer = writers.acquire(job_args.output, output_path(job_args.output, site, job_args.file_name, job_args.output_dir),
+                                 append=job_args.resume)
+        try:
+            run_job(scraper, job_args, writer)
+        finally:
+            if writers.release(writer):
+                console.print(f"[bold yellow]Data saved to:[/bold yellow] {writer.path} ({writer.count} records)")
+        return {'output': writer.path}
+
+    def status():
+        return {'metrics': metrics.snapshot()} if metrics.enabled else {}
+
+    def terminate(signum, frame):
+        # Service managers stop daemons with SIGTERM; wind down as on Ctrl-C
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    daemon = KreperDaemon(parse, run, workers=args.daemon_workers, status=status)
+    console.print(f"[bold green]Serving jobs on:[/bold green] {args.serve} ({daemon.workers} at a time)")
+    try:
+        daemon.serve(args.serve)
+    except KeyboardInterrupt:
+        console.print("[bold yellow]Daemon stopped[/bold yellow]")
+    except OSError as e:
+        console.print(f"[bold red]Error starting daemon:[/bold red] {e}")
+    finally:
+        if parse_pool:
+            parse_pool.shutdown()
+
+
+# Files every process of a distributed crawl would otherwise write at once
+WORKER_FILES = ('archive', 'stats_json', 'stats_prom', 'profile')
+
+
+def worker_part(args, partition):
+    # Each worker streams its records to its own jsonl part, merged by the coordinator
+    return output_path('jsonl', site_name(args.url), f"{args.file_name}-worker{partition}", args.output_dir)
+
+
+def worker_file(path, partition):
+    # a.warc.gz -> a-worker1.warc.gz, next to the original
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition('.')
+    return os.path.join(directory, f"{stem}-worker{partition}{dot}{extension}")
+
+
+def worker_args(args, partition):
+    """
+    The options of the worker for `partition`: its records, archive, stats
+    and profile go to files of its own.
+    """
+    job_args = argparse.Namespace(**vars(args))
+    job_args.file_name = f"{args.file_name}-worker{partition}"
+    for name in WORKER_FILES:
+        # An offline crawl only reads the archive, every worker can share it
+        if getattr(args, name) and not (name == 'archive' and args.offline):
+            setattr(job_args, name, worker_file(getattr(args, name), partition))
+    return job_args
+
+
+def run_worker(args, make_scraper, store, frontier):
+    """
+    Crawls the hosts of the partition `frontier` joined in the shared store
+    until the whole crawl is done. `args` are the worker's own, from
+    worker_args.
+    """
+    console.print(f"[bold green]Worker:[/bold green] partition {frontier.partition} of {frontier.partitions}")
+
+    writer = None
+    if args.output:
+        # Appended to, so a worker taking over a partition keeps what the last one wrote
+        writer = open_writer('jsonl', output_path('jsonl', site_name(args.url), args.file_name, args.output_dir),
+                             append=True)
+    try:
+        run_job(make_scraper(args.url), args, writer=writer, frontier=frontier)
+    finally:
+        if writer:
+            writer.close()
+        store.close()
+
+
+def run_coordinator(args, archive=None):
+    """
+    Sets up a crawl split over --distributed workers, starts --local-workers
+    of them on this machine (the others join with --worker from anywhere
+    that reaches the shared frontier), waits until the frontier is drained
+    and merges the workers' records into the requested output, and their
+    archives into `archive`.
+    """
+    partitions = args.distributed
+    store = SharedStore(args.shared_frontier)
+    try:
+        store.prepare(partitions, resume=args.resume, limit=args.limit)
+        store.seed([canonicalize_url(args.url)])
+        if not args.resume:
+            for partition in range(partitions):
+                if os.path.exists(worker_part(args, partition)):
+                    os.remove(worker_part(args, partition))
+        local = partitions if args.local_workers is None else min(args.local_workers, partitions)
+        console.print(f"[bold green]Distributed crawl:[/bold green] {partitions} workers, {local} started here")
+
+        # Workers run this same command line plus --worker
+        command = [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:] + ['--worker']
+        processes = [subprocess.Popen(command) for _ in range(local)]
+        try:
+            for process in processes:
+                process.wait()
+            crashed = [process.returncode for process in processes if process.returncode]
+            while not store.finished():
+                if crashed:
+                    # A worker that died never leaves, the crawl would wait for it forever
+                    console.print(f"[bold red]Error:[/bold red] {len(crashed)} worker(s) stopped with exit status "
+                                  f"{', '.join(map(str, crashed))} before the crawl was done; "
+                                  "continue it with --resume")
+                    return
+                time.sleep(1)
+        except KeyboardInterrupt:
+            # Workers stop cleanly on SIGINT; --resume continues from there
+            for process in processes:
+                if process.poll() is None:
+                    process.send_signal(signal.SIGINT)
+            for process in processes:
+                process.wait()
+            raise
+        done, failed, _ = store.progress()
+        console.print(f"[bold yellow]Crawled:[/bold yellow] {done} pages, {failed} failed")
+    finally:
+        store.close()
+
+    if archive is not None and not args.offline:
+        for partition in range(partitions):
+            part = worker_file(args.archive, partition)
+            if not os.path.exists(part):
+                # Workers on other machines keep their archive there
+                console.print(f"[bold yellow]Not merged:[/bold yellow] archive of worker {partition} "
+                              f"is not on this machine ({part})")
+                continue
+            archive.merge(part)
+            os.remove(part)
+            os.remove(f"{part}.idx")
+        console.print(f"[bold yellow]Pages archived to:[/bold yellow] {args.archive} ({len(archive)} pages)")
+
+    if args.output:
+        path = output_path(args.output, site_name(args.url), args.file_name, args.output_dir)
+        with open_writer(args.output, path) as writer:
+            for partition in range(partitions):
+                part = worker_part(args, partition)
+                if not os.path.exists(part):
+                    # Workers on other machines write their part there
+                    console.print(f"[bold yellow]Not merged:[/bold yellow] records of worker {partition} "
+                                  f"are not on this machine ({part})")
+                    continue
+                # Parts are kept, a resumed crawl adds to them
+                with open(part, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            writer.write(json.loads(line))
+        console.print(f"[bold yellow]Data saved to:[/bold yellow] {path} ({writer.count} records)")
+
+if __name__ == '__main__':
+    main()
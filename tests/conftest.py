@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from synthetic_site import SyntheticSite  # noqa: E402
+
+
+@pytest.fixture
+def synthetic_site():
+    """Starts a SyntheticSite built from the keyword arguments; returns its base URL."""
+    sites = []
+
+    def start(**params):
+        site = SyntheticSite(**params)
+        sites.append(site)
+        return site.start()
+
+    yield start
+    for site in sites:
+        site.stop()
+
+
+@pytest.fixture
+def static_site():
+    """Serves a dict of path -> HTML on a local port; returns its base URL."""
+    servers = []
+
+    def start(pages):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = pages.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def skraper(*argv, cwd, **kwargs):
+    """Runs skraper.py with the given options, as a user would."""
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'skraper.py'), *argv], cwd=cwd,
+                          capture_output=True, text=True, **kwargs)
@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+from conftest import ROOT, skraper
+
+from kreper.frontier import DONE
+
+
+def records(output_dir):
+    lines = []
+    for path in glob.glob(os.path.join(output_dir, '*', '.extracted_data', '*.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            lines += [json.loads(line) for line in f]
+    return lines
+
+
+def test_crawl_skips_malformed_links(static_site, tmp_path):
+    base = static_site({
+        '/': '<h1>home</h1><a href="http://127.0.0.1:99999/a">bad port</a><a href="http://[bad">bad host</a>'
+             '<a href="/ok.html">ok</a>',
+        '/ok.html': '<h1>ok</h1><a href="/">home</a>',
+    })
+    result = skraper('-u', base + '/', '--crawl', '--depth', '2', '--extract', 'h1', '--output', 'jsonl',
+                     '--output-dir', str(tmp_path), '--ignore-robots', cwd=tmp_path, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert sorted(record['h1'] for record in records(tmp_path)) == ['home', 'ok']
+
+
+def test_crawl_script_skips_malformed_links(static_site, tmp_path):
+    base = static_site({
+        '/': '<a href="http://127.0.0.1:99999/a">bad port</a><a href="/ok.html">ok</a>',
+        '/ok.html': '<p>ok</p>',
+    })
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'crawl', 'crawl.py'), base + '/'], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert '/ok.html' in result.stdout
+
+
+def test_resume_after_kill_keeps_every_record(synthetic_site, tmp_path):
+    base = synthetic_site(pages=60, fanout=4, page_size=2000, images=0, videos=0)
+    state = str(tmp_path / 'state.db')
+    # / and /page/0.html are both page 0, so 61 URLs cover the site
+    argv = ['-u', base + '/', '--crawl', '--depth', '60', '--limit', '61', '--extract', 'h1', '--output', 'jsonl',
+            '--output-dir', str(tmp_path), '--state-file', state, '--ignore-robots']
+
+    # Killed after the first state checkpoint (every 5 seconds), half way through
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'skraper.py'), *argv, '--rate', '5'],
+                               cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(7)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    db = sqlite3.connect(state)
+    done = db.execute('SELECT COUNT(*) FROM urls WHERE state = ?', (DONE,)).fetchone()[0]
+    db.close()
+    # Every page the state file counts as done has its record on disk
+    assert 0 < done <= len(records(tmp_path)) < 61
+
+    result = skraper(*argv, '--resume', cwd=tmp_path, timeout=120)
+    assert result.returncode == 0, result.stderr
+    # A page in flight at the kill may be written twice, none may be missing
+    assert {record['h1'] for record in records(tmp_path)} == {f"Page {i}" for i in range(60)}
+
+
+def test_resume_refuses_rewritten_outputs(tmp_path):
+    result = skraper('-u', 'http://127.0.0.1:9/', '--crawl', '--state-file', str(tmp_path / 'state.db'), '--resume',
+                     '--output', 'json', cwd=tmp_path, timeout=60)
+    assert result.returncode == 2
+    assert '--resume' in result.stderr
@@ -0,0 +1,49 @@
+import os
+import threading
+
+from kreper.media import MediaDownloader, MediaIndex
+from kreper.transport import Transport
+
+
+def test_downloaders_sharing_a_directory(synthetic_site, tmp_path):
+    base = synthetic_site(image_size=200000, latency=0.05)
+    # Two files named x.png with different content, and two URLs with the same content
+    urls = [f"{base}/media/img-a/x.png", f"{base}/media/img-b/x.png",
+            f"{base}/media/img-1-0.png", f"{base}/media/img-1-0.png?v=2"]
+    results = []
+    errors = []
+
+    def run():
+        try:
+            with Transport() as transport:
+                results.extend(MediaDownloader(transport, str(tmp_path), workers=4).download_all(urls))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert {result.status for result in results} <= {'downloaded', 'exists', 'duplicate'}
+    files = sorted(name for name in os.listdir(tmp_path) if not name.startswith('.'))
+    assert not [name for name in files if name.endswith('.part')]
+    # Both x.png are kept under their own names, the duplicate is not
+    assert len(files) == 3
+    assert len({open(tmp_path / name, 'rb').read() for name in files}) == 3
+
+
+def test_index_survives_an_interrupted_run(synthetic_site, tmp_path):
+    base = synthetic_site()
+    url = f"{base}/media/img-2-0.png"
+    with Transport() as transport:
+        # download() alone, as a run killed before download_all saves the index
+        result = MediaDownloader(transport, str(tmp_path)).download(url)
+    assert result.status == 'downloaded'
+
+    # What the next process loads from disk
+    index = MediaIndex(str(tmp_path))
+    assert index.urls[url] == os.path.basename(result.path)
+    assert list(index.hashes.values()) == [os.path.basename(result.path)]
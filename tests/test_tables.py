@@ -0,0 +1,48 @@
+from bs4 import BeautifulSoup
+
+from kreper.tables import MAX_SPAN, parse_table
+
+
+def table(html):
+    return parse_table(BeautifulSoup(html, 'html.parser').table)
+
+
+def test_spans_fill_every_slot():
+    parsed = table(
+        '<table><thead>'
+        '<tr><th rowspan="2">name</th><th colspan="2">score</th></tr>'
+        '<tr><th>min</th><th>max</th></tr>'
+        '</thead><tbody>'
+        '<tr><td rowspan="2">a</td><td>1</td><td>2.5</td></tr>'
+        '<tr><td>3</td><td>4</td></tr>'
+        '<tr><td>b</td><td rowspan="2">5</td><td>6</td></tr>'
+        '<tr><td>c</td></tr>'
+        '</tbody></table>'
+    )
+    assert parsed['headers'] == ['name', 'score / min', 'score / max']
+    assert parsed['types'] == ['string', 'int', 'float']
+    assert parsed['rows'] == [['a', 1, 2.5], ['a', 3, 4.0], ['b', 5, 6.0], ['c', 5, None]]
+
+
+def test_footer_goes_last():
+    parsed = table(
+        '<table><tfoot><tr><td colspan="2">total</td></tr></tfoot>'
+        '<tr><th>k</th><th>v</th></tr><tr><td>x</td><td>y</td></tr></table>'
+    )
+    assert parsed['headers'] == ['k', 'v']
+    assert parsed['rows'] == [['x', 'y'], ['total', 'total']]
+
+
+def test_gap_left_of_a_rowspan():
+    parsed = table('<table><tr><td>a</td><td rowspan="2">b</td></tr><tr></tr></table>')
+    assert parsed['rows'] == [['a', 'b'], ['', 'b']]
+
+
+def test_nested_tables_are_not_rows():
+    parsed = table('<table><tr><td>a</td><td><table><tr><td>n</td></tr></table></td></tr></table>')
+    assert len(parsed['rows']) == 1
+
+
+def test_broken_spans_are_bounded():
+    assert len(table('<table><tr><td colspan="99999">x</td></tr></table>')['headers']) == MAX_SPAN
+    assert table('<table><tr><td colspan="wide">x</td></tr></table>')['rows'] == [['x']]
@@ -0,0 +1,37 @@
+import pytest
+
+from kreper.urls import absolute_link, canonicalize_url, normalize_url
+
+
+def test_canonicalize_folds_spellings():
+    assert canonicalize_url('HTTP://Example.COM:80/a/./b/../c#top') == 'http://example.com/a/c'
+    assert canonicalize_url('https://example.com:443') == 'https://example.com/'
+    assert canonicalize_url('http://example.com/%7euser/%2f') == 'http://example.com/~user/%2F'
+
+
+def test_canonicalize_sorts_raw_query():
+    # Sorted by name, repeated names keep their order, nothing is re-encoded
+    url = 'http://example.com/s?q=a+b&flag&a=2&p=%20&a=1'
+    assert canonicalize_url(url) == 'http://example.com/s?a=2&a=1&flag&p=%20&q=a+b'
+
+
+def test_canonicalize_keeps_ipv6_brackets():
+    assert canonicalize_url('http://[::1]:8080/x') == 'http://[::1]:8080/x'
+    assert normalize_url('http://[::1]:80') == 'http://[::1]/'
+
+
+def test_canonicalize_rejects_port_out_of_range():
+    with pytest.raises(ValueError):
+        canonicalize_url('http://example.com:99999/a')
+
+
+@pytest.mark.parametrize('href, expected', [
+    ('../b#c', 'http://example.com/b'),
+    ('//other.org/x', 'http://other.org/x'),
+    ('mailto:someone@example.com', None),
+    ('javascript:void(0)', None),
+    ('http://example.com:99999/a', None),
+    ('http://[bad', None),
+])
+def test_absolute_link(href, expected):
+    assert absolute_link(href, 'http://example.com/a/page.html') == expected